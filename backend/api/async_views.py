@@ -0,0 +1,225 @@
+import asyncio
+from functools import wraps
+from hashlib import md5
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscriptions
+
+from .authentication import CachedTokenAuthentication
+from .cache import get_cache, response_key
+from .db import check_persistent_connections
+from .filters import IngredientFilter, RecipeFilter
+from .indexes import ingredient_index
+from .pagination import CustomPagination
+from .renderers import FastJSONRenderer
+from .serializers import (IngredientSerializer, RecipeReadSerializer,
+                          TagSerializer)
+
+CONTENT_TYPE = 'application/json'
+
+
+def in_thread(func, *args):
+    """
+    Как обработчики request_started/request_finished, но для потока
+    пула: там Django сам соединения не проверяет и не закрывает.
+    """
+    check_persistent_connections()
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def run(func, *args):
+    """
+    Синхронный ORM в пуле потоков. Вызовы из asyncio.gather идут
+    параллельно, у каждого потока свое соединение с базой.
+    """
+    return sync_to_async(in_thread, thread_sensitive=False)(func, *args)
+
+
+def render(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data),
+                        status=status, content_type=CONTENT_TYPE)
+
+
+def positive_int(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def async_get(view):
+    """
+    Только GET, пользователь по токену как в DRF:
+    нет токена - аноним, неверный токен - 401.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render(
+                {'detail': f'Method "{request.method}" not allowed.'}, 405)
+        result = None
+        if get_authorization_header(request):
+            try:
+                result = await run(
+                    CachedTokenAuthentication().authenticate, request)
+            except AuthenticationFailed as error:
+                return render({'detail': error.detail}, error.status_code)
+        request.user = result[0] if result else AnonymousUser()
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def ids(queryset, field):
+    return set(queryset.values_list(field, flat=True))
+
+
+async def set_flags(recipes, user):
+    """Избранное, корзина и подписки - три параллельных запроса."""
+    favorited = in_cart = subscribed = set()
+    if user.is_authenticated and recipes:
+        recipe_ids = [recipe.id for recipe in recipes]
+        favorited, in_cart, subscribed = await asyncio.gather(
+            run(ids, Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids), 'recipe_id'),
+            run(ids, ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids), 'recipe_id'),
+            run(ids, Subscriptions.objects.filter(
+                user=user,
+                following_id__in={recipe.author_id for recipe in recipes}
+            ), 'following_id'),
+        )
+    for recipe in recipes:
+        recipe.is_favorited = recipe.id in favorited
+        recipe.is_in_shopping_cart = recipe.id in in_cart
+        recipe.author_subscribed = recipe.author_id in subscribed
+
+
+def filtered_recipes(filterset):
+    """Поиск FTS5 выполняется уже здесь, поэтому тоже в потоке."""
+    if not filterset.is_valid():
+        return None
+    return filterset.qs
+
+
+def fetch(queryset):
+    return list(queryset.prefetch_related(*Recipe.objects.related_lookups()))
+
+
+def page_link(request, number, last):
+    if not 1 <= number <= last:
+        return None
+    url = request.build_absolute_uri()
+    if number == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', number)
+
+
+@async_get
+async def recipe_list(request):
+    """
+    GET /api/async/recipes/ - как список RecipeViewSet с page/limit.
+    COUNT и строки страницы, затем флаги пользователя - параллельно.
+    """
+    page_size = positive_int(
+        request.GET.get(CustomPagination.page_size_query_param),
+        CustomPagination.page_size)
+    number = positive_int(request.GET.get('page'), 1)
+    filterset = RecipeFilter(
+        request.GET, queryset=Recipe.objects.select_related('author'),
+        request=request)
+    queryset = await run(filtered_recipes, filterset)
+    if queryset is None:
+        return render(filterset.errors, 400)
+    start = (number - 1) * page_size
+    count, page = await asyncio.gather(
+        run(queryset.count), run(fetch, queryset[start:start + page_size]))
+    if not page and number > 1:
+        return render(
+            {'detail': str(CustomPagination.invalid_page_message)}, 404)
+    await set_flags(page, request.user)
+    last = max(1, ceil(count / page_size))
+    return render({
+        'count': count,
+        'next': page_link(request, number + 1, last),
+        'previous': page_link(request, number - 1, last),
+        'results': RecipeReadSerializer(
+            page, many=True, context={'request': request}).data,
+    })
+
+
+@async_get
+async def recipe_detail(request, pk):
+    """GET /api/async/recipes/<id>/ - рецепт и флаги параллельно."""
+    recipes = await run(fetch, Recipe.objects.select_related(
+        'author').filter(pk=pk))
+    if not recipes:
+        return render({'detail': 'Not found.'}, 404)
+    await set_flags(recipes, request.user)
+    return render(RecipeReadSerializer(
+        recipes[0], context={'request': request}).data)
+
+
+def cached_or_build(prefix, path, build):
+    """
+    Версия, чтение кэша и сборка при промахе. С Redis каждое
+    обращение к кэшу - сетевой запрос, поэтому все это в потоке.
+    """
+    key = response_key(prefix, 'json', path)
+    cached = get_cache().get(key)
+    if cached is None:
+        content = FastJSONRenderer().render(build())
+        cached = (content, CONTENT_TYPE, quote_etag(md5(content).hexdigest()))
+        get_cache().set(key, cached)
+    return cached
+
+
+async def cached_response(prefix, request, build):
+    """Готовый ответ из кэша API, как в CachedResponseMixin."""
+    cached = await run(cached_or_build, prefix, request.get_full_path(), build)
+    content, content_type, etag = cached
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+@async_get
+async def tag_list(request):
+    """GET /api/async/tags/"""
+    return await cached_response('tags', request, lambda: TagSerializer(
+        Tag.objects.all(), many=True).data)
+
+
+@async_get
+async def ingredient_list(request):
+    """GET /api/async/ingredients/?name= - поиск по индексу в памяти."""
+    def build():
+        name = request.GET.get('name')
+        if name:
+            return ingredient_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT)
+        return IngredientSerializer(IngredientFilter(
+            request.GET, queryset=Ingredient.objects.all()).qs,
+            many=True).data
+
+    return await cached_response('ingredients', request, build)
@@ -0,0 +1,130 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import bump_version, get_cache, get_version
+
+
+class TokenCache:
+    """
+    Снимки token -> (user, created) в LRU процесса с TTL
+    и, если включено SHARED, в общем кэше API.
+    Каждый снимок помечен версией токена из кэша API: выход, смена
+    пароля и блокировка сбрасывают версию, и снимок перестает
+    действовать во всех процессах, а не только в том, что обработал
+    запрос. Наружу всегда отдается копия пользователя.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def options():
+        return settings.TOKEN_AUTH_CACHE
+
+    @staticmethod
+    def digest(key):
+        return sha256(key.encode()).hexdigest()
+
+    def shared_key(self, key):
+        return f'api:token:{self.digest(key)}'
+
+    def version(self, key):
+        """Снимать до чтения токена из базы и передавать в set()."""
+        return get_version(f'token-{self.digest(key)}')
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1:]
+            self._entries.pop(key, None)
+        if self.options()['SHARED']:
+            return get_cache().get(self.shared_key(key))
+        return None
+
+    def get(self, key):
+        now = time.monotonic()
+        entry = self._lookup(key, now)
+        if entry is not None:
+            snapshot, version = entry
+            if version == self.version(key):
+                with self._lock:
+                    self.hits += 1
+                    self._put(key, snapshot, version, now)
+                return copy.deepcopy(snapshot)
+            with self._lock:
+                self._entries.pop(key, None)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put(self, key, snapshot, version, now):
+        options = self.options()
+        entry = self._entries.get(key)
+        expires = (entry[0] if entry is not None and entry[2] == version
+                   else now + options['TTL'])
+        self._entries[key] = (expires, snapshot, version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > options['SIZE']:
+            self._entries.popitem(last=False)
+
+    def set(self, key, snapshot, version):
+        snapshot = copy.deepcopy(snapshot)
+        with self._lock:
+            self._put(key, snapshot, version, time.monotonic())
+        if self.options()['SHARED']:
+            get_cache().set(self.shared_key(key), (snapshot, version),
+                            self.options()['TTL'])
+
+    def invalidate(self, keys):
+        """Сбрасывает снимки токенов keys во всех процессах."""
+        keys = list(keys)
+        for key in keys:
+            bump_version(f'token-{self.digest(key)}')
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.options()['SHARED'] and keys:
+            get_cache().delete_many([self.shared_key(key) for key in keys])
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries)}
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса в базу на каждый запрос:
+    пользователь берется из token_cache, база - только при промахе.
+    Кэш сбрасывается сигналами при выходе и изменении пользователя.
+    """
+
+    def authenticate_credentials(self, key):
+        if not self.options_enabled():
+            return super().authenticate_credentials(key)
+        snapshot = token_cache.get(key)
+        if snapshot is None:
+            version = token_cache.version(key)
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (user, token.created), version)
+            return user, token
+        user, created = snapshot
+        return user, self.get_model()(key=key, user=user, created=created)
+
+    @staticmethod
+    def options_enabled():
+        return settings.TOKEN_AUTH_CACHE['SIZE'] > 0
@@ -0,0 +1,31 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_version(prefix):
+    """Текущая версия данных prefix. Нет версии - заводим новую."""
+    cache = get_cache()
+    key = f'api:{prefix}:version'
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(prefix):
+    """Делает все закэшированные ответы prefix устаревшими."""
+    get_cache().set(f'api:{prefix}:version', uuid4().hex, None)
+
+
+def response_key(prefix, *parts):
+    digest = md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'api:{prefix}:{get_version(prefix)}:{digest}'
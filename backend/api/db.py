@@ -0,0 +1,49 @@
+from django.core import checks
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+from django.dispatch import receiver
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    """
+    Закрывает постоянные соединения, которые база уже оборвала
+    (перезапуск, idle timeout), чтобы запрос открыл новое,
+    а не упал на первом обращении к базе.
+    """
+    for connection in connections.all():
+        settings_dict = connection.settings_dict
+        if (connection.connection is None
+                or connection.in_atomic_block
+                or not settings_dict['CONN_MAX_AGE']
+                or not settings_dict.get('CONN_HEALTH_CHECKS')):
+            continue
+        if not connection.is_usable():
+            connection.close()
+
+
+@checks.register(checks.Tags.database)
+def check_database_connection(databases=None, **kwargs):
+    """manage.py check --database default: база доступна."""
+    errors = []
+    for alias in databases or ():
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as error:
+            errors.append(checks.Error(
+                f'Нет соединения с базой {alias}: {error}',
+                id='api.E001'))
+    return errors
+
+
+@checks.register(checks.Tags.database, deploy=True)
+def check_persistent_connections_enabled(**kwargs):
+    return [
+        checks.Warning(
+            f'База {alias}: CONN_MAX_AGE=0, соединение открывается '
+            'на каждый запрос.',
+            hint='Задайте DB_CONN_MAX_AGE, например 60.',
+            id='api.W001')
+        for alias in connections
+        if connections[alias].settings_dict['CONN_MAX_AGE'] == 0
+    ]
@@ -0,0 +1,58 @@
+import csv
+import json
+
+CHUNK_SIZE = 2000
+TITLE = 'Список необходимых ингредиентов:\n'
+CSV_HEADER = ('name', 'measurement_unit', 'amount')
+
+
+class Echo:
+    """
+    Буфер для csv.writer, который просто отдает записанную строку.
+    """
+    def write(self, value):
+        return value
+
+
+def rows(queryset):
+    """
+    Читает агрегированный список серверным курсором,
+    не загружая его в память целиком.
+    """
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield (
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['sum_amount'],
+        )
+
+
+def export_txt(queryset):
+    yield TITLE
+    for name, unit, amount in rows(queryset):
+        yield f'{name.capitalize()} ({unit}) - {amount}\n'
+
+
+def export_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows(queryset):
+        yield writer.writerow(row)
+
+
+def export_json(queryset):
+    yield '['
+    separator = ''
+    for row in rows(queryset):
+        yield separator + json.dumps(
+            dict(zip(CSV_HEADER, row)), ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+}
@@ -1,6 +1,21 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 # from django.db.models import Q
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
+
+from .cache import get_cache, get_version
+
+
+def tag_ids_by_slug():
+    """Словарь slug -> id тэгов, живет в кэше до изменения тэгов."""
+    cache = get_cache()
+    key = f'api:tags:{get_version("tags")}:slugs'
+    mapping = cache.get(key)
+    if mapping is None:
+        mapping = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, mapping)
+    return mapping
 
 
 class IngredientFilter(FilterSet):
@@ -12,16 +27,35 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.CharFilter(method='filter_tags')
     author = filters.NumberFilter(field_name='author__id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering')
+
+    popular_ordering = ('-favorites_count', '-id')
+    search_ordering = ('-search_rank', '-id')
 
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тэгов ?tags=a&tags=b.
+        Один EXISTS по таблице связей, без JOIN и DISTINCT.
+        """
+        mapping = tag_ids_by_slug()
+        tag_ids = {mapping[slug] for slug in self.data.getlist(name)
+                   if slug in mapping}
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids)))
+
     def filter_is_favorited(self, queryset, name, value):
         if value:
             return queryset.filter(favorites__user=self.request.user)
@@ -30,5 +64,16 @@ class RecipeFilter(FilterSet):
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
             return queryset.filter(
-                shopping_cart_recipe__user=self.request.user)
+                shopping_cart__user=self.request.user)
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(*self.popular_ordering)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            *self.search_ordering)
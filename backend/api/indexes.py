@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Ingredient, IngredientRecipe
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс ингридиентов в памяти процесса
+    для автодополнения без похода в базу.
+    Сбрасывается сигналами при изменении Ingredient и по TTL,
+    чтобы подхватить изменения из других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = ([], [])
+        self._loaded_at = None
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _load(self):
+        entries = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda entry: (entry['name'].casefold(), entry['id'])
+        )
+        self._data = ([entry['name'].casefold() for entry in entries],
+                      entries)
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if (loaded_at is not None
+                and time.monotonic() - loaded_at
+                < settings.INGREDIENT_INDEX_TTL):
+            return
+        with self._lock:
+            if self._loaded_at is loaded_at:
+                self._load()
+
+    def search(self, query, limit):
+        """
+        Сначала ингридиенты, начинающиеся с query, затем те,
+        где query встречается внутри названия.
+        """
+        self._ensure_loaded()
+        keys, entries = self._data
+        query = query.casefold()
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(entries[position])
+            position += 1
+        for key, entry in zip(keys, entries):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(entry)
+        return result
+
+
+class PantryIndex:
+    """
+    Обратный индекс ингридиент -> отсортированный массив id рецептов
+    и число ингридиентов каждого рецепта (массив по id рецепта).
+    Правки рецептов этого процесса применяются сразу после коммита,
+    правки из других процессов подхватываются по TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._loaded_at = None
+
+    def _load(self):
+        pairs = np.array(
+            IngredientRecipe.objects.order_by().values_list(
+                'ingredient_id', 'recipe_id'),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        width = int(pairs[:, 1].max()) + 1 if len(pairs) else 1
+        keys = np.unique(pairs[:, 0] * width + pairs[:, 1])
+        ingredients, recipes = np.divmod(keys, width)
+        starts = np.flatnonzero(np.diff(ingredients, prepend=-1))
+        postings = dict(zip(
+            ingredients[starts].tolist(), np.split(recipes, starts[1:])))
+        self._data = (postings, np.bincount(recipes, minlength=width))
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if (loaded_at is not None
+                and time.monotonic() - loaded_at
+                < settings.PANTRY_INDEX_TTL):
+            return
+        with self._lock:
+            if self._loaded_at is loaded_at:
+                self._load()
+
+    def _apply(self, recipe_id, old_ids, new_ids):
+        with self._lock:
+            if self._data is None:
+                return
+            postings, totals = self._data
+            postings = dict(postings)
+            for ingredient_id in old_ids - new_ids:
+                recipes = np.setdiff1d(
+                    postings.get(ingredient_id, ()), [recipe_id])
+                if len(recipes):
+                    postings[ingredient_id] = recipes
+                else:
+                    postings.pop(ingredient_id, None)
+            for ingredient_id in new_ids - old_ids:
+                postings[ingredient_id] = np.union1d(
+                    postings.get(ingredient_id, np.empty(0, np.int64)),
+                    [recipe_id])
+            if recipe_id >= len(totals):
+                totals = np.resize(totals, recipe_id + 1)
+                totals[len(self._data[1]):] = 0
+            else:
+                totals = totals.copy()
+            totals[recipe_id] = len(new_ids)
+            self._data = (postings, totals)
+
+    def update_recipe(self, recipe_id, old_ids=(), new_ids=()):
+        """
+        Переносит рецепт в индексе после коммита транзакции.
+        Для удаленного рецепта new_ids пустой.
+        """
+        old_ids, new_ids = set(old_ids), set(new_ids)
+        if old_ids != new_ids:
+            transaction.on_commit(
+                lambda: self._apply(recipe_id, old_ids, new_ids))
+
+    def search(self, ingredient_ids, limit):
+        """
+        Рецепты, где есть хотя бы один из ingredient_ids, по убыванию
+        доли имеющихся ингридиентов, затем по числу недостающих.
+        Возвращает список (recipe_id, coverage, missing).
+        """
+        self._ensure_loaded()
+        postings, totals = self._data
+        found = [postings[ingredient_id] for ingredient_id
+                 in set(ingredient_ids) if ingredient_id in postings]
+        if not found or limit <= 0:
+            return []
+        recipes, matched = np.unique(
+            np.concatenate(found), return_counts=True)
+        total = totals[recipes]
+        coverage = matched / total
+        if len(recipes) > limit:
+            threshold = np.partition(coverage, -limit)[-limit]
+            keep = coverage >= threshold
+            recipes, total = recipes[keep], total[keep]
+            matched, coverage = matched[keep], coverage[keep]
+        missing = total - matched
+        order = np.lexsort((-recipes, missing, -coverage))[:limit]
+        return list(zip(recipes[order].tolist(),
+                        coverage[order].tolist(),
+                        missing[order].tolist()))
+
+
+ingredient_index = IngredientIndex()
+pantry_index = PantryIndex()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build resized image variants for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        done = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                build_image_variants(recipe_id)
+                done += 1
+            except (OSError, ValueError) as e:
+                self.stdout.write(self.style.ERROR(
+                    f'Recipe {recipe_id}: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} recipes'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.similarity import build_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Build the memory-mapped index for similar recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Index directory, '
+                            'SIMILARITY_INDEX_DIR by default')
+
+    def handle(self, *args, **options):
+        recipes, features = build_similarity_index(options['dir'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {recipes} recipes over {features} features'))
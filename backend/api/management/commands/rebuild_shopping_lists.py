@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the aggregated shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare stored lists with carts')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {ShoppingListItem.objects.count()} items'))
+            return
+        expected = {
+            (row['user_id'], row['ingredient_id']): row['total_amount']
+            for row in ShoppingListItem.objects.expected()
+        }
+        stored = {
+            (row['user_id'], row['ingredient_id']): row['total_amount']
+            for row in ShoppingListItem.objects.values(
+                'user_id', 'ingredient_id', 'total_amount')
+        }
+        mismatched = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in mismatched:
+            self.stdout.write(self.style.WARNING(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored.get((user_id, ingredient_id))}, '
+                f'expected {expected.get((user_id, ingredient_id))}'))
+        if mismatched:
+            raise CommandError(f'{len(mismatched)} items are out of date')
+        self.stdout.write(self.style.SUCCESS('Shopping lists are up to date'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscriptions, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'followers_count', Subscriptions, 'following'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def actual_count(related, field):
+    return Coalesce(Subquery(
+        related.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized counters and fix the ones that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report counters that are out of date')
+
+    def handle(self, *args, **options):
+        stale_total = 0
+        with transaction.atomic():
+            for model, field, related, related_field in COUNTERS:
+                actual = actual_count(related, related_field)
+                stale = model.objects.annotate(actual=actual).exclude(
+                    **{field: F('actual')})
+                count = stale.count()
+                stale_total += count
+                if count and not options['check']:
+                    model.objects.filter(
+                        pk__in=stale.values('pk')
+                    ).update(**{field: actual})
+                self.stdout.write(
+                    f'{model.__name__}.{field}: {count} out of date')
+        if options['check'] and stale_total:
+            raise CommandError(f'{stale_total} counters are out of date')
+        self.stdout.write(self.style.SUCCESS('Counters are up to date'))
@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+DATA_DIR = 'data'
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    """CSV с заголовком или без него (тогда колонки идут как в fields)."""
+    reader = csv.reader(file)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip() for column in first]
+    if header != list(fields):
+        header = fields
+        yield dict(zip(header, first))
+    for row in reader:
+        yield dict(zip(header, row))
+
+
+def read_json(file, fields):
+    """Массив JSON, разбираемый по одному объекту без чтения всего файла."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file must contain an array')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Unexpected end of JSON file')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_ndjson(file, fields):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+}
+
+
+class BulkLoadCommand(BaseCommand):
+    """
+    Загрузка справочника пачками через bulk_create.
+    Повторный запуск ничего не дублирует: записи, чей natural_key
+    уже есть в базе, пропускаются. Строки, которые нарушили другое
+    уникальное поле, не теряются молча, а выводятся как ошибки.
+    """
+    model = None
+    fields = ()
+    required = ()
+    natural_key = ()
+    default_filename = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', nargs='?',
+                            default=self.default_filename, type=str,
+                            help='CSV, JSON or NDJSON file in data/')
+        parser.add_argument('--format', choices=READERS,
+                            help='Input format, by default from extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Load and roll back, only report')
+
+    def rows(self, reader, stats):
+        for row in reader:
+            stats['read'] += 1
+            values = {
+                field: str(row.get(field) or '').strip()
+                for field in self.fields
+            }
+            if not all(values[field] for field in self.required):
+                stats['invalid'] += 1
+                continue
+            yield self.model(**{
+                field: value for field, value in values.items() if value
+            })
+
+    def key(self, obj):
+        return tuple(getattr(obj, field) for field in self.natural_key)
+
+    def existing_keys(self, objects):
+        """natural_key из objects, которые уже есть в базе."""
+        field = self.natural_key[0]
+        return set(self.model.objects.filter(**{
+            f'{field}__in': {getattr(obj, field) for obj in objects}
+        }).values_list(*self.natural_key))
+
+    def load_batch(self, batch, stats):
+        seen = self.existing_keys(batch)
+        new = []
+        for obj in batch:
+            key = self.key(obj)
+            if key in seen:
+                stats['present'] += 1
+                continue
+            seen.add(key)
+            new.append(obj)
+        # Конфликты по natural_key отсеяны выше, сюда попадают
+        # только нарушения других уникальных полей.
+        self.model.objects.bulk_create(new, ignore_conflicts=True)
+        created = self.existing_keys(new) if new else set()
+        for obj in new:
+            if self.key(obj) in created:
+                stats['created'] += 1
+                continue
+            stats['rejected'] += 1
+            self.stderr.write(self.style.ERROR(
+                'Rejected, conflicts with an existing row: ' + ', '.join(
+                    f'{field}={getattr(obj, field)!r}'
+                    for field in self.fields)))
+
+    def after_load(self):
+        """Хук для сброса кэшей: bulk_create не шлет сигналы."""
+
+    def handle(self, *args, **options):
+        filename = options['filename']
+        file_path = os.path.join(os.getcwd(), DATA_DIR, filename)
+        file_format = (
+            options['format'] or os.path.splitext(filename)[1].lstrip('.')
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format: {file_format}')
+        batch_size = options['batch_size']
+        stats = dict.fromkeys(
+            ('read', 'invalid', 'present', 'created', 'rejected'), 0)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file, \
+                    transaction.atomic():
+                objects = self.rows(
+                    READERS[file_format](file, self.fields), stats)
+                batch = list(islice(objects, batch_size))
+                while batch:
+                    self.load_batch(batch, stats)
+                    batch = list(islice(objects, batch_size))
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+        except FileNotFoundError:
+            raise CommandError(f'File not found: {file_path}')
+        if not options['dry_run']:
+            self.after_load()
+        style = self.style.ERROR if stats['rejected'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{"Dry run: " if options["dry_run"] else ""}'
+            f'read {stats["read"]}, created {stats["created"]}, '
+            f'already present {stats["present"]}, '
+            f'rejected {stats["rejected"]}, invalid {stats["invalid"]}'))
+        if stats['rejected']:
+            raise CommandError(
+                f'{stats["rejected"]} rows conflict with existing rows '
+                'on a unique field other than the natural key')
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from recipes.tasks import in_eager_task
+
+logger = logging.getLogger('api.metrics')
+
+# Метрики текущего запроса. ContextVar, а не атрибут соединения:
+# sync_to_async копирует контекст в поток, так что запросы ORM
+# из потоков пула (async_views.run, синхронные вьюхи под ASGI)
+# попадают в метрики своего запроса.
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(connection, **kwargs):
+    """Обертка ставится один раз на соединение каждого потока."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetrics:
+    """
+    Метрики одного запроса. Как execute_wrapper считает запросы
+    к базе и время в них. Запросы задач, выполненных сразу
+    (BACKGROUND_TASKS_EAGER), идут отдельно в task_queries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = perf_counter()
+        self.queries = 0
+        self.task_queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if in_eager_task():
+            with self._lock:
+                self.task_queries += 1
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            # Под asyncio.gather запросы одного ответа идут из разных потоков.
+            with self._lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+    @contextmanager
+    def counting(self):
+        previous = current_metrics.get()
+        current_metrics.set(self)
+        try:
+            yield
+        finally:
+            current_metrics.set(previous)
+
+    def start_view(self):
+        self.view_started = (perf_counter(), self.db_time)
+
+    def finish_view(self):
+        """Время вьюхи без базы - для DRF это в основном сериализаторы."""
+        if self.view_started is None:
+            return
+        started, db_time = self.view_started
+        self.view_time = (
+            perf_counter() - started - (self.db_time - db_time))
+        self.view_started = None
+
+    def as_dict(self):
+        total = perf_counter() - self.started
+        return {
+            'queries': self.queries,
+            'task_queries': self.task_queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2),
+            'render_ms': round(self.render_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+
+
+class MetricsMiddleware:
+    """
+    Для каждого ответа: число запросов к базе, время в базе,
+    время вьюхи без базы (сериализаторы), время рендера и общее
+    время по имени маршрута. Пишет их в логгер api.metrics
+    и в заголовок Server-Timing, а сверх QUERY_BUDGETS - warning.
+    Потоковые ответы меряются до конца выдачи: заголовок уходит
+    с метриками вьюхи, а в лог попадают и запросы из итератора.
+    Под ASGI работает асинхронно и не гонит запросы /api/async/
+    через единственный поток sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Как MiddlewareMixin: обработчик увидит корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = request.metrics = RequestMetrics()
+        with metrics.counting():
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        with metrics.counting():
+            response = await self.get_response(request)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        metrics = request.metrics
+        metrics.finish_view()
+        match = request.resolver_match
+        route = match and match.view_name
+        self.add_header(response, metrics.as_dict())
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, route, response.streaming_content)
+        else:
+            self.report(request, response, route, metrics.as_dict())
+        return response
+
+    def stream(self, request, response, route, content):
+        metrics = request.metrics
+        try:
+            with metrics.counting():
+                yield from content
+        finally:
+            self.report(request, response, route, metrics.as_dict())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.start_view()
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после вьюхи - меряем отдельно."""
+        request.metrics.finish_view()
+        started = perf_counter()
+
+        def rendered(response):
+            request.metrics.render_time = perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def budget(route, method):
+        return settings.QUERY_BUDGETS.get(
+            (route, method), settings.QUERY_BUDGET_DEFAULT)
+
+    @staticmethod
+    def add_header(response, metrics):
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics["db_ms"]};'
+                f'desc="{metrics["queries"]} queries"',
+                f'view;dur={metrics["view_ms"]}',
+                f'render;dur={metrics["render_ms"]}',
+                f'total;dur={metrics["total_ms"]}',
+            ))
+
+    def report(self, request, response, route, metrics):
+        metrics = {'route': route, 'method': request.method,
+                   'status': response.status_code, **metrics}
+        message = ' '.join(f'{key}={value}' for key, value in metrics.items())
+        budget = self.budget(route, request.method)
+        if route is not None and metrics['queries'] > budget:
+            logger.warning('query budget %s exceeded: %s', budget, message,
+                           extra={'metrics': metrics})
+        else:
+            logger.info(message, extra={'metrics': metrics})
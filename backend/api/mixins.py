@@ -1,4 +1,11 @@
-from rest_framework import mixins, viewsets
+from hashlib import md5
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import mixins, status, viewsets
+
+from .cache import get_cache, response_key
 
 
 class ListViewSet(mixins.ListModelMixin,
@@ -7,3 +14,76 @@ class ListViewSet(mixins.ListModelMixin,
     Для GETзапросов.
     """
     pass
+
+
+class CachedResponseMixin:
+    """
+    Хранит отрендеренные ответы list/retrieve в кэше под ключом
+    с версией cache_prefix и отвечает 304 на совпавший If-None-Match.
+    Версию сбрасывают сигналы в api/signals.py.
+    """
+    cache_prefix = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'api':
+            # Browsable API зависит от пользователя, его не кэшируем.
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = response_key(
+            self.cache_prefix,
+            request.accepted_renderer.format,
+            request.get_full_path()
+        )
+        cached = cache.get(key)
+        if cached is None:
+            response = self.finalize_response(
+                request, handler(request, *args, **kwargs), *args, **kwargs)
+            response.render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (
+                response.content,
+                response['Content-Type'],
+                quote_etag(md5(response.content).hexdigest()),
+            )
+            cache.set(key, cached)
+        content, content_type, etag = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304, если валидатор (ETag из дешевого состояния объекта)
+    совпал с тем, что прислал клиент, и только иначе строит ответ.
+    """
+
+    def conditional_response(self, request, state, last_modified, build):
+        etag = quote_etag(md5(repr(state).encode()).hexdigest())
+        # Флаги пользователя меняются без updated_at, поэтому
+        # If-Modified-Since учитываем только для анонимов.
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=(
+                None if request.user.is_authenticated or not last_modified
+                else int(last_modified.timestamp())
+            ),
+        )
+        if response is None:
+            response = build()
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -1,6 +1,46 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору без COUNT(*) и OFFSET.
+    Порядок берется из cursor_ordering вьюсета.
+    """
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Обычная пагинация page/limit.
+    Если в запросе есть ?cursor=, переключается на KeysetPagination.
+    """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.cursor_class.cursor_query_param in request.query_params:
+            self.cursor = self.cursor_class()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Лента подписок всегда листается по курсору.
+    """
+    ordering = ('-feed_created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
@@ -1,11 +1,35 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import (Favorite, Ingredient, Recipe, IngredientRecipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.feed import fan_out_recipe
+from recipes.images import build_image_variants
+from recipes.tasks import run_in_background
 from users.models import User
 
+from .indexes import pantry_index
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии картинки рецепта.
+    Пока фоновая задача их не сделала, отдается пустой словарь.
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in (value or {}).items():
+            url = default_storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     """
@@ -58,6 +82,8 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj: User) -> bool:
         """проверяет подписан ли автор на рецепт"""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -80,10 +106,11 @@ class SubsSerializer(serializers.ModelSerializer):
     """
     Сериализатор для связи подписчиков и рецептов.
     """
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
@@ -96,9 +123,12 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(required=True)
     email = serializers.EmailField(required=True)
     recipes = SubsSerializer(many=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     def get_is_subscribed(self, obj: User) -> bool:
         """проверяет подписан ли автор на рецепт"""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -114,7 +144,8 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
-            'recipes'
+            'recipes',
+            'recipes_count'
         )
 
 
@@ -177,19 +208,30 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     """
     Сериализатор рецпептов на чтение.
     """
-    author = CustomUserSerializer(read_only=True)
+    author = serializers.SerializerMethodField()
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
+    def get_author(self, obj):
+        """Передает автору флаг подписки, посчитанный в выборке."""
+        if obj.author is None:
+            return None
+        if hasattr(obj, 'author_subscribed'):
+            obj.author.is_subscribed = obj.author_subscribed
+        return CustomUserSerializer(obj.author, context=self.context).data
+
     def get_ingredients(self, obj):
         """Возвращает отдельный сериализатор."""
         return ReadIngredientRecipeSerializer(
-            IngredientRecipe.objects.filter(recipe=obj).all(), many=True
+            obj.recipe_ingredients.all(), many=True
         ).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request:
             current_user = request.user
@@ -199,6 +241,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request:
             current_user = request.user
@@ -209,7 +253,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('search_vector',)
         read_only_fields = ('id', 'slug', 'author', 'created_at', 'updated_at')
 
 
@@ -217,8 +261,7 @@ class CreateIngredientRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор рецпептов и ингридиентов на создание.
     """
-    id = serializers.SlugRelatedField(queryset=Ingredient.objects.all(),
-                                      slug_field='id')
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -234,14 +277,38 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """
     image = Base64ImageField(max_length=None)
     author = CustomUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = CreateIngredientRecipeSerializer(
         many=True,
     )
-    is_favorited = serializers.SerializerMethodField()
+
+    @staticmethod
+    def resolve_ids(model, ids, label):
+        """
+        Все объекты по ids одним запросом IN. Повторы и ненайденные
+        id возвращаются одной ошибкой.
+        """
+        duplicates = sorted({pk for pk in ids if ids.count(pk) > 1})
+        if duplicates:
+            raise serializers.ValidationError(
+                f'{label} повторяются: '
+                f'{", ".join(map(str, duplicates))}')
+        found = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'{label} не найдены: {", ".join(map(str, missing))}')
+        return [found[pk] for pk in ids]
+
+    def validate_tags(self, value):
+        return self.resolve_ids(Tag, value, 'Тэги')
+
+    def validate_ingredients(self, value):
+        ingredients = self.resolve_ids(
+            Ingredient, [item['id'] for item in value], 'Ингридиенты')
+        for item, ingredient in zip(value, ingredients):
+            item['id'] = ingredient
+        return value
 
     @staticmethod
     def add_ingredients(recipe, ingredients):
@@ -252,27 +319,90 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients]
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
-        recipe.tags.set(tags)
+        User.objects.filter(pk=request.user.pk).update(
+            recipes_count=F('recipes_count') + 1)
+        recipe.tags.add(*tags)
+        pantry_index.update_recipe(
+            recipe.id, new_ids=[item['id'].id for item in ingredients])
         self.add_ingredients(recipe=recipe, ingredients=ingredients)
+        run_in_background(build_image_variants, recipe.id)
+        run_in_background(fan_out_recipe, recipe.id)
         return recipe
 
+    @staticmethod
+    def sync_ingredients(recipe, ingredients):
+        """
+        Приводит ингридиенты рецепта к ingredients: меняет только
+        добавленные, удаленные и изменившиеся строки.
+        Возвращает составы до и после {ingredient_id: amount}.
+        """
+        new_amounts = {}
+        for item in ingredients:
+            ingredient_id = item['id'].id
+            new_amounts[ingredient_id] = (
+                new_amounts.get(ingredient_id, 0) + item['amount'])
+        old_amounts, rows, to_delete, to_update = {}, {}, [], []
+        for row in IngredientRecipe.objects.filter(recipe=recipe):
+            old_amounts[row.ingredient_id] = (
+                old_amounts.get(row.ingredient_id, 0) + row.amount)
+            if row.ingredient_id in rows:
+                to_delete.append(row.id)
+            else:
+                rows[row.ingredient_id] = row
+        for ingredient_id, row in rows.items():
+            if ingredient_id not in new_amounts:
+                to_delete.append(row.id)
+            elif row.amount != new_amounts[ingredient_id]:
+                row.amount = new_amounts[ingredient_id]
+                to_update.append(row)
+        if to_delete:
+            IngredientRecipe.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientRecipe.objects.bulk_update(to_update, ['amount'])
+        IngredientRecipe.objects.bulk_create(
+            [IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+             for ingredient_id, amount in new_amounts.items()
+             if ingredient_id not in rows]
+        )
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        self.add_ingredients(recipe=instance, ingredients=ingredients)
+        """
+        Пишет только разницу с тем, что уже лежит в базе, и по ней же
+        обновляет списки покупок и индекс кладовой. Поиск пересчитает
+        сигнал сохранения рецепта после коммита.
+        """
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        old_amounts = new_amounts = {}
+        if 'ingredients' in validated_data:
+            old_amounts, new_amounts = self.sync_ingredients(
+                instance, validated_data.pop('ingredients'))
+        ShoppingListItem.objects.apply_recipe_change(instance, {
+            ingredient_id: new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        })
+        pantry_index.update_recipe(instance.id, old_amounts, new_amounts)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+            run_in_background(build_image_variants, instance.id)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        """Ответ собирается теми же запросами, что и при чтении."""
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_related(request.user).get(
+            pk=instance.pk)
         return RecipeReadSerializer(instance, context=context).data
 
     class Meta:
@@ -285,11 +415,34 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор мелкий рецпептов на чтение.
     """
+    image_variants = ImageVariantsField()
+
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         model = Recipe
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Список id рецептов для пакетного избранного и корзины.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
+
+
+class PantryRecipeSerializer(ShortRecipeSerializer):
+    """
+    Короткий рецепт с долей имеющихся ингридиентов.
+    """
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('coverage', 'missing')
+
+
 class SubscriptionsListSerializer(serializers.ModelSerializer):
     """
     Сериализатор для подписчиков.
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.search import update_search_index
+from recipes.tasks import on_commit_batched
+
+from .authentication import token_cache
+from .cache import bump_version
+from .indexes import ingredient_index
+
+# Поля автора, которые видны в ответе рецепта.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def touch_recipes(recipe_ids, using='default'):
+    """
+    Новый updateed_at - новые ETag и Last-Modified у списка и рецепта,
+    когда состав, тэги или автор меняются без сохранения рецепта.
+    """
+    Recipe.objects.using(using).filter(pk__in=recipe_ids).update(
+        updateed_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def reset_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, using, **kwargs):
+    """Название ингридиента входит в поисковые данные его рецептов."""
+    if not created:
+        on_commit_batched(update_search_index, IngredientRecipe.objects.using(
+            using).filter(ingredient=instance).values_list(
+                'recipe_id', flat=True), using)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def reindex_recipe(instance, using, update_fields=None, **kwargs):
+    """
+    Любое сохранение и удаление рецепта - из API, админки или
+    shell. Сохранение без названия и описания поиск не меняет.
+    """
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        on_commit_batched(update_search_index, [instance.pk], using)
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+def reindex_ingredient_recipe(instance, using, **kwargs):
+    """
+    Поштучные правки состава. bulk_create/bulk_update сигналов
+    не шлют: сериализатор при этом сохраняет сам рецепт.
+    """
+    on_commit_batched(update_search_index, [instance.recipe_id], using)
+    on_commit_batched(touch_recipes, [instance.recipe_id], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(instance, action, reverse, pk_set, using,
+                         **kwargs):
+    """Тэги рецепта меняют и с его стороны, и со стороны тэга."""
+    if action == 'pre_clear' and reverse:
+        recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    else:
+        recipe_ids = pk_set if reverse else [instance.pk]
+    if recipe_ids:
+        on_commit_batched(touch_recipes, recipe_ids, using)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def reset_tags_cache(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(instance, **kwargs):
+    """Выход через djoser удаляет токен - снимок тоже."""
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(instance, created, **kwargs):
+    """
+    Смена пароля, блокировка и прочие правки пользователя
+    сбрасывают снимки его токенов.
+    """
+    if not created:
+        token_cache.invalidate(Token.objects.filter(
+            user=instance).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=get_user_model())
+def touch_author_recipes(instance, created, update_fields=None, **kwargs):
+    """Имя и почта автора есть в каждом его рецепте."""
+    if not created and (
+            update_fields is None or AUTHOR_FIELDS & set(update_fields)):
+        Recipe.objects.filter(author=instance).update(
+            updateed_at=timezone.now())
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from recipes.models import IngredientRecipe, Recipe
+
+ARRAYS = ('recipe_ids', 'sizes', 'feature_keys', 'indptr', 'rows')
+META = 'meta.json'
+
+
+def ingredient_keys(ingredient_ids):
+    return np.asarray(ingredient_ids, dtype=np.int64) * 2
+
+
+def tag_keys(tag_ids):
+    return np.asarray(tag_ids, dtype=np.int64) * 2 + 1
+
+
+def recipe_features():
+    """
+    Пары (recipe_id, признак): ингридиенты - четные ключи,
+    тэги - нечетные.
+    """
+    ingredients = np.array(
+        IngredientRecipe.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    tags = np.array(
+        Recipe.tags.through.objects.order_by().values_list(
+            'recipe_id', 'tag_id'),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    return (
+        np.concatenate((ingredients[:, 0], tags[:, 0])),
+        np.concatenate((ingredient_keys(ingredients[:, 1]),
+                        tag_keys(tags[:, 1]))),
+    )
+
+
+def build_similarity_index(directory=None):
+    """
+    Строит матрицу признак x рецепт в формате CSC и кладет ее
+    в новую папку версии. meta.json пишется последним, поэтому
+    воркеры никогда не видят недописанный индекс. Предыдущая версия
+    остается на диске для воркеров, которые еще ее открывают.
+    """
+    directory = directory or settings.SIMILARITY_INDEX_DIR
+    recipes, features = recipe_features()
+    pairs = np.unique(np.stack((features, recipes), axis=1), axis=0)
+    recipe_ids, rows = np.unique(pairs[:, 1], return_inverse=True)
+    feature_keys, columns = np.unique(pairs[:, 0], return_inverse=True)
+    arrays = {
+        'recipe_ids': recipe_ids,
+        'sizes': np.bincount(rows, minlength=len(recipe_ids)),
+        'feature_keys': feature_keys,
+        'indptr': np.concatenate(
+            ([0], np.cumsum(np.bincount(
+                columns, minlength=len(feature_keys))))),
+        'rows': rows.astype(np.int32),
+    }
+    version = str(time.time_ns())
+    os.makedirs(os.path.join(directory, version))
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, version, f'{name}.npy'), array)
+    meta_path = os.path.join(directory, META)
+    with open(f'{meta_path}.tmp', 'w') as meta:
+        json.dump({'version': version, 'recipes': len(recipe_ids)}, meta)
+    os.replace(f'{meta_path}.tmp', meta_path)
+    versions = sorted(
+        (name for name in os.listdir(directory)
+         if os.path.isdir(os.path.join(directory, name))), key=int)
+    for name in versions[:-2]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return len(recipe_ids), len(feature_keys)
+
+
+class SimilarityIndex:
+    """
+    Индекс похожих рецептов, отображенный в память (mmap).
+    Все воркеры читают одни и те же файлы, страницы общие через
+    кэш ОС. Новая версия подхватывается по времени изменения meta.json.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+
+    def _ensure_loaded(self):
+        meta_path = os.path.join(settings.SIMILARITY_INDEX_DIR, META)
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime:
+            return self._data
+        with self._lock:
+            if mtime != self._mtime:
+                with open(meta_path) as meta:
+                    version = json.load(meta)['version']
+                folder = os.path.join(settings.SIMILARITY_INDEX_DIR, version)
+                self._data = {
+                    name: np.load(os.path.join(folder, f'{name}.npy'),
+                                  mmap_mode='r')
+                    for name in ARRAYS
+                }
+                self._mtime = mtime
+        return self._data
+
+    def similar(self, recipe_id, ingredient_ids, tag_ids, limit):
+        """
+        Рецепты с наибольшим коэффициентом Жаккара по ингридиентам
+        и тэгам. Признаки самого рецепта берутся из базы, так что
+        рецепты новее индекса тоже получают рекомендации.
+        Возвращает список (recipe_id, score).
+        """
+        data = self._ensure_loaded()
+        keys = np.unique(np.concatenate(
+            (ingredient_keys(ingredient_ids), tag_keys(tag_ids))))
+        if data is None or not len(keys) or limit <= 0:
+            return []
+        feature_keys = data['feature_keys']
+        columns = np.searchsorted(feature_keys, keys)
+        valid = columns < len(feature_keys)
+        columns = columns[valid]
+        columns = columns[feature_keys[columns] == keys[valid]]
+        if not len(columns):
+            return []
+        indptr, rows = data['indptr'], data['rows']
+        matched = np.bincount(
+            np.concatenate([rows[indptr[column]:indptr[column + 1]]
+                            for column in columns]),
+            minlength=len(data['recipe_ids']))
+        candidates = np.flatnonzero(matched)
+        recipe_ids = data['recipe_ids'][candidates]
+        keep = recipe_ids != recipe_id
+        candidates, recipe_ids = candidates[keep], recipe_ids[keep]
+        common = matched[candidates]
+        scores = common / (len(keys) + data['sizes'][candidates] - common)
+        if len(scores) > limit:
+            keep = scores >= np.partition(scores, -limit)[-limit]
+            recipe_ids, scores = recipe_ids[keep], scores[keep]
+        order = np.lexsort((-recipe_ids, -scores))[:limit]
+        return list(zip(recipe_ids[order].tolist(),
+                        scores[order].tolist()))
+
+
+similarity_index = SimilarityIndex()
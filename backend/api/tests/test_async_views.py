@@ -0,0 +1,37 @@
+import asyncio
+from unittest import mock
+
+from django.test import AsyncClient, TransactionTestCase
+
+from api import async_views
+from api.cache import get_cache
+
+
+def running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class CachedResponseTest(TransactionTestCase):
+    """Кэш API (Redis в проде) не читается в цикле событий."""
+
+    def setUp(self):
+        get_cache().clear()
+
+    async def test_cache_off_event_loop(self):
+        loops = []
+
+        def tracked_cache():
+            loops.append(running_loop())
+            return get_cache()
+
+        client = AsyncClient()
+        with mock.patch.object(async_views, 'get_cache', tracked_cache):
+            miss = await client.get('/api/async/tags/')
+            hit = await client.get('/api/async/tags/')
+        self.assertEqual(miss.status_code, 200)
+        self.assertEqual(hit.content, miss.content)
+        self.assertTrue(loops)
+        self.assertEqual(loops, [None] * len(loops))
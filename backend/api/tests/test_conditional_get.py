@@ -0,0 +1,70 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, IngredientRecipe
+
+from .utils import create_recipes, create_tags, create_user
+
+
+class ConditionalGetTest(APITestCase):
+    """ETag списка и рецепта меняются вместе с тем, что есть в ответе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags(2)
+        cls.author = create_user('author')
+        cls.recipe = create_recipes(cls.author, 3, tags=cls.tags[:1])[0]
+        cls.detail = f'/api/recipes/{cls.recipe.id}/'
+
+    def assert_changed(self, url, change, changed=True):
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        status = self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+        self.assertEqual(status, 200 if changed else 304)
+
+    def test_unchanged(self):
+        for url in ('/api/recipes/', self.detail):
+            with self.subTest(url=url):
+                self.assert_changed(url, lambda: None, changed=False)
+
+    def test_tag_renamed(self):
+        def rename():
+            self.tags[0].name = 'завтрак'
+            self.tags[0].save()
+
+        self.assert_changed('/api/recipes/', rename)
+        self.assert_changed(self.detail, rename)
+
+    def test_ingredient_renamed(self):
+        ingredient = IngredientRecipe.objects.filter(
+            recipe=self.recipe).first().ingredient
+
+        def rename():
+            ingredient.name = 'кинза'
+            ingredient.save()
+
+        self.assert_changed(self.detail, rename)
+
+    def test_ingredient_row_added(self):
+        ingredient = Ingredient.objects.create(
+            name='тмин', measurement_unit='г')
+        self.assert_changed(
+            self.detail, lambda: IngredientRecipe.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=1))
+
+    def test_tags_changed_from_tag_side(self):
+        self.assert_changed(
+            self.detail, lambda: self.tags[1].recipes.add(self.recipe))
+        self.assert_changed(self.detail, self.tags[1].recipes.clear)
+
+    def test_author_renamed(self):
+        def rename():
+            self.author.first_name = 'Анна'
+            self.author.save()
+
+        self.assert_changed('/api/recipes/', rename)
+        self.assert_changed(self.detail, rename)
+
+    def test_last_login_keeps_etag(self):
+        self.assert_changed(self.detail, lambda: self.author.save(
+            update_fields=['last_login']), changed=False)
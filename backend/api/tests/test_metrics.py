@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from django.http import JsonResponse
+from django.test import (AsyncClient, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import path
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import ShoppingCart
+
+from .utils import create_recipes, create_user
+
+
+class MetricsMiddlewareTest(APITestCase):
+    """Бюджеты по (маршрут, метод) и потоковые ответы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(cls.author, 3)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def metrics(self, logs):
+        return [record.metrics for record in logs.records]
+
+    def get_level(self, budgets):
+        with override_settings(QUERY_BUDGETS=budgets):
+            with self.assertLogs('api.metrics', 'INFO') as logs:
+                self.client.get('/api/recipes/')
+        [record] = logs.records
+        return record.levelname
+
+    def test_budget_by_method(self):
+        self.assertEqual(
+            self.get_level({('recipes-list', 'GET'): 1}), 'WARNING')
+        self.assertEqual(self.get_level({
+            ('recipes-list', 'GET'): 10, ('recipes-list', 'POST'): 1,
+        }), 'INFO')
+
+    def test_streaming_queries_counted(self):
+        with self.assertLogs('api.metrics', 'INFO') as logs:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/')
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+            response.close()
+        [metrics] = self.metrics(logs)
+        self.assertEqual(metrics['route'], 'recipes-download-shopping-cart')
+        # Вьюха запросов не делает, все они - из итератора.
+        self.assertGreaterEqual(metrics['queries'], 1)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class EagerTaskMetricsTest(TransactionTestCase):
+    """Задачи после коммита выполняются внутри запроса, но не в бюджете."""
+
+    def test_eager_tasks_outside_budget(self):
+        author = create_user('author')
+        create_recipes(author, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('user'))
+        with self.assertLogs('api.metrics', 'INFO') as logs:
+            response = self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        [record] = logs.records
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertGreater(record.metrics['task_queries'], 0)
+
+
+async def slow_view(request):
+    await asyncio.sleep(0.2)
+    return JsonResponse({})
+
+
+urlpatterns = [path('slow/', slow_view, name='slow')]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncMetricsTest(SimpleTestCase):
+    """Под ASGI middleware не выстраивает async-вьюхи в очередь."""
+
+    async def test_async_requests_run_concurrently(self):
+        client = AsyncClient()
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.get('/slow/') for _ in range(4)))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(
+            [response.status_code for response in responses], [200] * 4)
+        self.assertLess(elapsed, 0.6)
@@ -0,0 +1,134 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.feed import backfill_feed
+from recipes.models import Favorite, Ingredient, ShoppingCart
+from users.models import Subscriptions
+
+from .utils import create_recipes, create_tags, create_user
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image():
+    buffer = BytesIO()
+    Image.new('RGB', (32, 32), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetsTest(TransactionTestCase):
+    """
+    Каждый маршрут из QUERY_BUDGETS на данных, похожих на настоящие,
+    укладывается в свой бюджет - с промахом кэша токенов.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        tags = self.tags = create_tags(3)
+        self.author = create_user('author')
+        self.user = create_user('user')
+        recipes = self.recipes = create_recipes(
+            self.author, 30, tags=tags, ingredients_per_recipe=5)
+        self.other = create_recipes(create_user('other'), 10, tags=tags[:1])
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+        Favorite.objects.bulk_create(
+            Favorite(user=self.user, recipe=recipe) for recipe in recipes[:5])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe=recipe)
+            for recipe in recipes[:5])
+        # Рецепт пользователя, который он удаляет, - в корзине
+        # и в избранном у других.
+        self.own = create_recipes(self.user, 1, tags=tags)[0]
+        for user in (self.author, create_user('reader')):
+            Favorite.objects.create(user=user, recipe=self.own)
+            ShoppingCart.objects.create(user=user, recipe=self.own)
+        Subscriptions.objects.subscribe(self.user.id, self.author.id)
+        backfill_feed(self.user.id, self.author.id)
+        call_command('reconcile_counters', stdout=StringIO())
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def body(self, **changes):
+        return {
+            'name': 'борщ', 'text': 'свекла', 'cooking_time': 30,
+            'image': image(), 'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [{'id': ingredient.id, 'amount': 2}
+                            for ingredient in self.ingredients[:4]],
+            **changes,
+        }
+
+    def requests(self):
+        recipe = self.recipes[0]
+        other, author = self.other[0], self.author
+        return [
+            ('get', '/api/recipes/?limit=6', None),
+            ('get', f'/api/recipes/{recipe.id}/', None),
+            ('get', '/api/recipes/feed/', None),
+            ('get', f'/api/recipes/{recipe.id}/similar/', None),
+            ('get', '/api/recipes/pantry/?ingredients='
+             + ','.join(str(item.id) for item in self.ingredients[:3]),
+             None),
+            ('get', '/api/recipes/download_shopping_cart/', None),
+            ('post', f'/api/recipes/{other.id}/favorite/', None),
+            ('delete', f'/api/recipes/{other.id}/favorite/', None),
+            ('post', f'/api/recipes/{other.id}/shopping_cart/', None),
+            ('delete', f'/api/recipes/{other.id}/shopping_cart/', None),
+            ('get', '/api/tags/', None),
+            ('get', '/api/ingredients/?name=ingr', None),
+            ('get', '/api/users/', None),
+            ('get', '/api/users/me/', None),
+            ('get', f'/api/users/{author.id}/', None),
+            ('get', '/api/users/subscriptions/', None),
+            ('delete', f'/api/users/{author.id}/subscribe/', None),
+            ('post', f'/api/users/{author.id}/subscribe/', None),
+            ('post', '/api/recipes/', self.body()),
+            ('patch', '/api/recipes/{new}/', self.body(
+                name='щи', tags=[self.tags[2].id],
+                ingredients=[{'id': ingredient.id, 'amount': 3}
+                             for ingredient in self.ingredients[2:7]])),
+            ('delete', f'/api/recipes/{self.own.id}/', None),
+        ]
+
+    def test_routes_within_budget(self):
+        seen = set()
+        new = None
+        for method, url, data in self.requests():
+            # PATCH правит рецепт, только что созданный через POST.
+            url = url.replace('{new}', str(new))
+            token_cache.invalidate(
+                Token.objects.values_list('key', flat=True))
+            with self.assertLogs('api.metrics', 'INFO') as logs:
+                response = getattr(self.client, method)(
+                    url, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                    response.close()
+            self.assertLess(response.status_code, 300, (url, response))
+            if method == 'post' and url == '/api/recipes/':
+                new = response.data['id']
+            [record] = logs.records
+            metrics = record.metrics
+            key = (metrics['route'], metrics['method'])
+            seen.add(key)
+            with self.subTest(route=key):
+                self.assertLessEqual(
+                    metrics['queries'], settings.QUERY_BUDGETS[key])
+        self.assertEqual(seen, set(settings.QUERY_BUDGETS))
@@ -0,0 +1,54 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscriptions
+
+from .utils import create_recipes, create_tags, create_user
+
+URL = '/api/recipes/'
+PAGE_SIZES = (6, 50, 500)
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        recipes = create_recipes(cls.author, 500, tags=create_tags())
+        cls.favorited = {recipe.id for recipe in recipes[::3]}
+        cls.in_cart = {recipe.id for recipe in recipes[::5]}
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe_id=pk) for pk in cls.favorited)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe_id=pk)
+            for pk in cls.in_cart)
+        Subscriptions.objects.create(user=cls.reader, following=cls.author)
+
+    def assert_fixed_budget(self, budget):
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(URL, {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        # COUNT, страница с флагами, тэги, ингридиенты.
+        self.assert_fixed_budget(4)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.reader)
+        self.assert_fixed_budget(4)
+
+    def test_flags_come_from_annotations(self):
+        self.client.force_authenticate(self.reader)
+        results = self.client.get(URL, {'limit': 500}).data['results']
+        for recipe in results:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in self.favorited)
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in self.in_cart)
+            self.assertTrue(recipe['author']['is_subscribed'])
+            self.assertEqual(len(recipe['ingredients']), 3)
+            self.assertEqual(len(recipe['tags']), 3)
@@ -0,0 +1,66 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.search import FTS_TABLE, search_recipes
+
+from .utils import create_recipes, create_user
+
+
+class SearchIndexTest(TestCase):
+    """Поиск пересчитывается после коммита при любом изменении рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipes(create_user('author'), 1)[0]
+        cls.ingredient = Ingredient.objects.create(
+            name='кумкват', measurement_unit='г')
+
+    def found(self, query):
+        return self.recipe.id in search_recipes(
+            Recipe.objects.all(), query).values_list('id', flat=True)
+
+    def test_recipe_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'окрошка'
+            self.recipe.save()
+        self.assertTrue(self.found('окрошка'))
+
+    def test_ingredient_rows(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            row = IngredientRecipe.objects.create(
+                recipe=self.recipe, ingredient=self.ingredient, amount=1)
+        self.assertTrue(self.found('кумкват'))
+        with self.captureOnCommitCallbacks(execute=True):
+            row.delete()
+        self.assertFalse(self.found('кумкват'))
+
+    def test_ingredient_renamed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(
+                recipe=self.recipe, ingredient=self.ingredient, amount=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = 'фейхоа'
+            self.ingredient.save()
+        self.assertTrue(self.found('фейхоа'))
+        self.assertFalse(self.found('кумкват'))
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+    def test_recipe_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipe.pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_rebuild_command(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='солянка')
+        self.assertFalse(self.found('солянка'))
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertTrue(self.found('солянка'))
@@ -0,0 +1,96 @@
+import logging
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from users.models import Subscriptions
+
+from .utils import create_user
+
+THREADS = 8
+
+
+# Лента заполняется после коммита и к гонке подписок не относится.
+@mock.patch('api.views.run_in_background', mock.Mock())
+class SubscribeRaceTest(TransactionTestCase):
+    """Одновременные подписки на одного автора из разных потоков."""
+
+    def store_error(self, **kwargs):
+        # Сигнал общий для всех потоков, но отправляется в потоке,
+        # где упал запрос: ключ - этот поток.
+        self.errors[threading.get_ident()] = sys.exc_info()[1]
+
+    def post(self, user, author):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        try:
+            for _ in range(50):
+                response = client.post(f'/api/users/{author.id}/subscribe/')
+                if response.status_code != 500:
+                    return response.status_code
+                error = self.errors.pop(threading.get_ident())
+                # SQLite при конкуренции отвечает "table is locked",
+                # транзакция откатилась - повтор честный. Остальное,
+                # в том числе IntegrityError, - ошибка теста.
+                if not (isinstance(error, OperationalError)
+                        and 'locked' in str(error)):
+                    raise error
+                time.sleep(0.01)
+            return 500
+        finally:
+            connections.close_all()
+
+    def race(self, pairs):
+        barrier = threading.Barrier(len(pairs))
+        statuses = {pair: [] for pair in pairs}
+
+        def worker(pair):
+            barrier.wait()
+            try:
+                statuses[pair].append(self.post(*pair))
+            except Exception as error:
+                statuses[pair].append(error)
+
+        threads = [threading.Thread(target=worker, args=(pair,))
+                   for pair in pairs]
+        self.errors = {}
+        got_request_exception.connect(self.store_error)
+        self.addCleanup(got_request_exception.disconnect, self.store_error)
+        # Повторы после блокировок SQLite - ожидаемые 500, без логов.
+        with mock.patch.object(logging.getLogger('django.request'),
+                               'disabled', True), \
+                mock.patch.object(logging.getLogger('api.metrics'),
+                                  'disabled', True):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        for codes in statuses.values():
+            for code in codes:
+                if isinstance(code, Exception):
+                    raise code
+        return statuses
+
+    def test_one_created_per_pair(self):
+        authors = [create_user(f'author{i}') for i in range(2)]
+        users = [create_user(f'user{i}') for i in range(2)]
+        pairs = [(user, author) for user in users for author in authors]
+        statuses = self.race(pairs * (THREADS // len(pairs)))
+        for (user, author), codes in statuses.items():
+            with self.subTest(user=user.username, author=author.username):
+                self.assertEqual(len(codes), THREADS // len(pairs))
+                self.assertEqual(sorted(codes), [201] + [400] * (
+                    len(codes) - 1))
+        for user in authors + users:
+            user.refresh_from_db()
+            self.assertEqual(
+                user.followers_count,
+                Subscriptions.objects.filter(following=user).count())
+        for author in authors:
+            self.assertEqual(author.followers_count, len(users))
@@ -0,0 +1,67 @@
+from django.db import connection
+from django.http import QueryDict
+from rest_framework.test import APITestCase
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe
+
+from .utils import create_recipes, create_tags, create_user, explain
+
+URL = '/api/recipes/'
+# Уникальный составной (recipe_id, tag_id), который Django создает сам.
+TAG_INDEX = 'recipes_recipe_tags_recipe_id_tag_id'
+
+
+class TagFilterTest(APITestCase):
+    """Фильтр ?tags= - один EXISTS по таблице связей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags(3)
+        recipes = create_recipes(create_user('author'), 40)
+        # Рецепт i получает тэги по битам i % 8: есть рецепты
+        # без тэгов, с одним, двумя и всеми тремя.
+        cls.recipe_tags = {
+            recipe.id: {tag.slug for bit, tag in enumerate(cls.tags)
+                        if index % 8 & 1 << bit}
+            for index, recipe in enumerate(recipes)
+        }
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for index, recipe in enumerate(recipes)
+            for bit, tag in enumerate(cls.tags) if index % 8 & 1 << bit)
+
+    def expected(self, slugs):
+        return {pk for pk, tags in self.recipe_tags.items() if tags & slugs}
+
+    def get(self, *slugs):
+        return self.client.get(URL, {'tags': slugs, 'limit': 100}).data
+
+    def test_several_tags_without_duplicates(self):
+        for slugs in ({'tag0'}, {'tag0', 'tag1'}, {'tag0', 'tag1', 'tag2'}):
+            with self.subTest(slugs=slugs):
+                data = self.get(*slugs)
+                ids = [recipe['id'] for recipe in data['results']]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), self.expected(slugs))
+                self.assertEqual(data['count'], len(self.expected(slugs)))
+
+    def test_unknown_slugs_return_nothing(self):
+        data = self.get('missing')
+        self.assertEqual(data['count'], 0)
+        self.assertEqual(data['results'], [])
+        data = self.get('missing', 'tag2')
+        self.assertEqual(data['count'], len(self.expected({'tag2'})))
+
+    def test_plan_uses_tag_index_without_distinct(self):
+        queryset = RecipeFilter(
+            QueryDict('tags=tag0&tags=tag1'),
+            queryset=Recipe.objects.all()).qs
+        self.assertNotIn('DISTINCT', str(queryset.query).upper())
+        if connection.vendor == 'postgresql':
+            # На маленькой таблице планировщик выбрал бы seq scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = explain(queryset)
+        self.assertIn(TAG_INDEX, plan)
+        self.assertNotIn('DISTINCT', plan.upper())
@@ -0,0 +1,31 @@
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+
+from recipes.tasks import on_commit_batched
+
+
+class OnCommitBatchedTest(TestCase):
+    """Пачка ids вызывается раз на коммит и не переживает откат."""
+
+    def setUp(self):
+        self.calls = []
+
+    def record(self, ids, using):
+        self.calls.append(ids)
+
+    def test_one_call_per_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_batched(self.record, [3, 1])
+            on_commit_batched(self.record, [2, 3])
+        self.assertEqual(self.calls, [[1, 2, 3]])
+
+    def test_rolled_back_ids_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    on_commit_batched(self.record, [1])
+                    raise DatabaseError
+            on_commit_batched(self.record, [2])
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_batched(self.record, [3])
+        self.assertEqual(self.calls, [[2], [3]])
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+
+from api.cache import bump_version
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import User
+
+BATCH_SIZE = 1000
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com', username=username,
+        password='Test-pass-1', first_name=username, last_name=username)
+
+
+def create_tags(count=3):
+    Tag.objects.bulk_create(
+        Tag(name=f'tag{i}', color=f'#0000{i:02d}', slug=f'tag{i}')
+        for i in range(count))
+    # bulk_create не шлет сигналы, карту slug -> id сбрасываем сами.
+    bump_version('tags')
+    return list(Tag.objects.order_by('id'))
+
+
+def create_recipes(author, count, tags=(), ingredients_per_recipe=3,
+                   ingredients_count=10):
+    """
+    count рецептов автора, у каждого все tags и несколько ингридиентов:
+    рецепт i берет ингридиенты i..i+ingredients_per_recipe по кругу.
+    Ингридиенты у каждого автора свои. Пачками - годится и для
+    бенчмарков на миллионе рецептов.
+    """
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'ingredient {author.pk}-{i}', measurement_unit='г')
+         for i in range(ingredients_count)),
+        batch_size=BATCH_SIZE)
+    # bulk_create возвращает id не на всех базах.
+    ingredients = list(Ingredient.objects.filter(
+        name__startswith=f'ingredient {author.pk}-').order_by('id'))
+    Recipe.objects.bulk_create(
+        (Recipe(author=author, name=f'recipe {i}', text='text',
+                cooking_time=10, image='recipes/test.png')
+         for i in range(count)),
+        batch_size=BATCH_SIZE)
+    recipes = list(Recipe.objects.filter(author=author).order_by('id'))
+    IngredientRecipe.objects.bulk_create(
+        (IngredientRecipe(recipe=recipe,
+                          ingredient=ingredients[(i + j) % len(ingredients)],
+                          amount=j + 1)
+         for i, recipe in enumerate(recipes)
+         for j in range(ingredients_per_recipe)),
+        batch_size=BATCH_SIZE)
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+         for recipe in recipes for tag in tags),
+        batch_size=BATCH_SIZE)
+    call_command('reconcile_counters', stdout=StringIO())
+    return recipes
+
+
+def explain(queryset):
+    """План запроса одной строкой, как его отдает база."""
+    sql, params = queryset.query.sql_with_params()
+    prefix = ('EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+              else 'EXPLAIN')
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
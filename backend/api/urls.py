@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (IngredientViewSet, RecipeViewSet,
                     TagViewSet, UsersViewSet)
 
@@ -10,8 +11,18 @@ router_v1.register('users', UsersViewSet, basename='users')
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
 
+# Асинхронные копии самых нагруженных GET-запросов для ASGI-воркеров.
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list, name='async-recipes-list'),
+    path('recipes/<int:pk>/', async_views.recipe_detail,
+         name='async-recipes-detail'),
+    path('tags/', async_views.tag_list, name='async-tags-list'),
+    path('ingredients/', async_views.ingredient_list,
+         name='async-ingredients-list'),
+]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,61 +1,155 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Subquery,
+                              Value, prefetch_related_objects)
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from recipes.models import (Ingredient, Recipe, IngredientRecipe,
-                            ShoppingCart, Tag)
+from recipes.feed import backfill_feed, drop_author_from_feed, feed_queryset
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.tasks import run_in_background
 from users.models import Subscriptions, User
 
+from .cache import get_version
+from .exporters import EXPORTERS
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .indexes import ingredient_index, pantry_index
+from .mixins import CachedResponseMixin, ConditionalGetMixin
+from .pagination import CustomPagination, FeedPagination
+from .renderers import CSVRenderer, FastJSONRenderer, PlainTextRenderer
 from .serializers import (CustomUserSerializer, ShortRecipeSerializer,
-                          IngredientSerializer, RecipeCreateSerializer,
+                          IngredientSerializer, PantryRecipeSerializer,
+                          RecipeCreateSerializer, RecipeIdsSerializer,
                           RecipeReadSerializer, ShoppingCartSerializer,
                           SubscriptionsSerializer,
                           TagSerializer, UserCreateSerializer)
+from .similarity import similarity_index
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Для отображения рецептов.
     """
+    counters = {
+        Favorite: 'favorites_count',
+        ShoppingCart: 'in_carts_count',
+    }
     serializer_class = RecipeReadSerializer
     queryset = Recipe.objects.all()
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.with_related(self.request.user)
+
+    @property
+    def cursor_ordering(self):
+        params = self.request.query_params
+        if params.get('ordering') == 'popular':
+            return RecipeFilter.popular_ordering
+        if params.get('search', '').strip():
+            return RecipeFilter.search_ordering
+        return Recipe._meta.ordering
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return RecipeCreateSerializer
         return RecipeReadSerializer
 
+    @staticmethod
+    def catalog_versions():
+        """Правки тэгов и ингридиентов меняют ответ без updateed_at."""
+        return get_version('tags'), get_version('ingredients')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Валидатор страницы - id, время изменения и флаги рецептов
+        и версии справочников. Тэги и ингридиенты догружаются,
+        только если ответ нужно строить.
+        """
+        queryset = self.filter_queryset(
+            Recipe.objects.with_flags(request.user).select_related('author')
+        )
+        page = self.paginate_queryset(queryset)
+        page_info = getattr(self.paginator, 'page', None)
+        state = (
+            page_info and page_info.paginator.count,
+            [(recipe.id, recipe.updateed_at, recipe.is_favorited,
+              recipe.is_in_shopping_cart, recipe.author_subscribed)
+             for recipe in page],
+            self.catalog_versions(),
+        )
+
+        def build():
+            prefetch_related_objects(page, *Recipe.objects.related_lookups())
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        return self.conditional_response(
+            request, state,
+            max((recipe.updateed_at for recipe in page), default=None),
+            build
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            state = Recipe.objects.with_flags(request.user).values_list(
+                'updateed_at', 'is_favorited', 'is_in_shopping_cart',
+                'author_subscribed'
+            ).filter(pk=kwargs[self.lookup_field]).first()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            request, (state, self.catalog_versions()), state[0],
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs)
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingListItem.objects.drop_recipe(instance)
+        pantry_index.update_recipe(
+            instance.id, instance.recipe_ingredients.values_list(
+                'ingredient_id', flat=True))
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') - 1)
+        instance.delete()
+
+    @transaction.atomic
     def add_to(self, model, user, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         obj, created = model.objects.get_or_create(user=user, recipe=recipe)
         if created:
+            Recipe.objects.filter(pk=recipe.pk).bump(self.counters[model], 1)
             serializer = ShortRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_304_NOT_MODIFIED)
 
+    @transaction.atomic
     def delete_from(self, model, user, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
-        obj = get_object_or_404(model, user=user, recipe=recipe)
-        obj.delete()
+        if not model.objects.remove(user.id, [recipe.pk]):
+            raise Http404
+        Recipe.objects.filter(pk=recipe.pk).bump(self.counters[model], -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(methods=('post', 'delete'), detail=True)
+    @action(methods=('post', 'delete'), detail=True,
+            permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
-        return self.manage_fav_or_shopcart(
-            pk,
-            self.request.user.favorites
-        )
+        if request.method == 'POST':
+            return self.add_to(Favorite, request.user, pk)
+        return self.delete_from(Favorite, request.user, pk)
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
@@ -68,41 +162,168 @@ class RecipeViewSet(viewsets.ModelViewSet):
         }
         serializer = ShoppingCartSerializer(data=cart_data, context=context)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            cart, created = ShoppingCart.objects.get_or_create(
+                user=request.user, recipe=recipe)
+            if not created:
+                return Response(
+                    {'errors': 'Рецепт уже в списке покупок'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            Recipe.objects.filter(pk=recipe.pk).bump('in_carts_count', 1)
+            ShoppingListItem.objects.add_recipes(request.user, [recipe.id])
+        return Response(ShoppingCartSerializer(cart, context=context).data,
+                        status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
     def del_from_cart(self, request, pk):
-        get_object_or_404(
-            ShoppingCart,
-            user=request.user,
-            recipe=get_object_or_404(Recipe, id=pk)
-        ).delete()
+        recipe = get_object_or_404(Recipe, id=pk)
+        with transaction.atomic():
+            if not ShoppingCart.objects.remove(request.user.id, [recipe.id]):
+                raise Http404
+            Recipe.objects.filter(pk=recipe.pk).bump('in_carts_count', -1)
+            ShoppingListItem.objects.remove_recipes(request.user, [recipe.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(methods=["get"], detail=False)
+    @transaction.atomic
+    def bulk_change(self, request, model):
+        """
+        Добавляет или убирает пачку рецептов {"recipes": [id, ...]}
+        одной командой с RETURNING: счетчики и список покупок меняются
+        только на то, что изменила именно эта команда, даже если
+        параллельный запрос трогает те же рецепты.
+        Статус возвращается для каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('id', flat=True))
+        if request.method == 'POST':
+            changed = model.objects.add(request.user.id, sorted(found))
+            statuses = ('added', 'exists')
+        else:
+            changed = model.objects.remove(request.user.id, sorted(found))
+            statuses = ('removed', 'absent')
+        delta = 1 if request.method == 'POST' else -1
+        if changed:
+            Recipe.objects.filter(pk__in=changed).bump(
+                self.counters[model], delta)
+        if changed and model is ShoppingCart:
+            if delta > 0:
+                ShoppingListItem.objects.add_recipes(request.user, changed)
+            else:
+                ShoppingListItem.objects.remove_recipes(
+                    request.user, changed)
+        changed = set(changed)
+        return Response({'results': [
+            {'id': pk, 'status': (
+                'not_found' if pk not in found
+                else statuses[0] if pk in changed else statuses[1])}
+            for pk in recipe_ids
+        ]})
+
+    @action(methods=['post', 'delete'], detail=False,
+            url_path='favorite', url_name='bulk-favorite',
+            permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        return self.bulk_change(request, Favorite)
+
+    @action(methods=['post', 'delete'], detail=False,
+            url_path='shopping_cart', url_name='bulk-shopping-cart',
+            permission_classes=[IsAuthenticated])
+    def bulk_shopping_cart(self, request):
+        return self.bulk_change(request, ShoppingCart)
+
+    @action(methods=['get'], detail=False,
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Новые рецепты авторов из подписок, по курсору.
+        """
+        queryset = feed_queryset(
+            request.user, Recipe.objects.with_related(request.user))
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def pantry(self, request):
+        """
+        Что приготовить из имеющегося:
+        ?ingredients=1,2,3&limit=10.
+        """
+        ingredients = ','.join(request.query_params.getlist('ingredients'))
+        limit = request.query_params.get('limit', '10')
+        try:
+            ingredient_ids = [int(pk) for pk in ingredients.split(',') if pk]
+            limit = min(int(limit), settings.PANTRY_SEARCH_LIMIT)
+        except ValueError:
+            raise ValidationError(
+                'ingredients и limit должны быть целыми числами')
+        found = pantry_index.search(ingredient_ids, limit)
+        recipes = Recipe.objects.in_bulk([pk for pk, _, _ in found])
+        result = []
+        for pk, coverage, missing in found:
+            recipe = recipes.get(pk)
+            if recipe is not None:
+                recipe.coverage, recipe.missing = coverage, missing
+                result.append(recipe)
+        serializer = PantryRecipeSerializer(
+            result, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по ингридиентам и тэгам, ?limit= до
+        SIMILARITY_LIMIT.
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        limit = request.query_params.get('limit', '6')
+        if not limit.isdigit():
+            raise ValidationError('limit должен быть целым числом')
+        found = similarity_index.similar(
+            recipe.id,
+            recipe.recipe_ingredients.values_list('ingredient_id', flat=True),
+            recipe.tags.values_list('id', flat=True),
+            min(int(limit), settings.SIMILARITY_LIMIT)
+        )
+        recipes = Recipe.objects.in_bulk([pk for pk, _ in found])
+        serializer = ShortRecipeSerializer(
+            [recipes[pk] for pk, _ in found if pk in recipes], many=True,
+            context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer,
+                              FastJSONRenderer])
     def download_shopping_cart(self, request):
+        """
+        Отдает список покупок потоком в формате txt, csv или json.
+        Формат выбирается через ?format= или заголовок Accept.
+        """
         user = request.user
-        filename = f'{user.username}_shopping_list.txt'
-        ingrs = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(sum_amount=Sum('amount'))
-        text_list = ['Список необходимых ингредиентов:\n']
-        text_list += [
-            f'{i.get("ingredient__name").capitalize()} '
-            f'({i.get("ingredient__measurement_unit")}) - '
-            f'{i.get("sum_amount")}\n' for i in list(ingrs)
-        ]
-        response = HttpResponse(text_list, content_type='text/plain')
+        renderer = request.accepted_renderer
+        filename = f'{user.username}_shopping_list.{renderer.format}'
+        ingrs = ShoppingListItem.objects.filter(user=user).values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            sum_amount=F('total_amount')
+        ).order_by('ingredient__name')
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](ingrs),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
         response['Content-Disposition'] = (
             f'attachment; filename="{filename}"'
         )
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     Для отображения Тэгов.
     Если убрать pagination_class = None  Тэги пропадут с фронта.
@@ -110,9 +331,10 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_prefix = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     Для отображения ингридиентов.
     """
@@ -122,6 +344,16 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     search_fields = ('^name')
+    cache_prefix = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('name'):
+            return self.cached_response(self.search, request)
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request):
+        return Response(ingredient_index.search(
+            request.query_params['name'], settings.INGREDIENT_SEARCH_LIMIT))
 
 
 class UsersViewSet(viewsets.ModelViewSet):
@@ -131,16 +363,39 @@ class UsersViewSet(viewsets.ModelViewSet):
     serializer_class = CustomUserSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
     lookup_field = 'pk'
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
-        print(self.action)
         if self.action == 'subscriptions':
-            subs = self.request.user.following.all()
-            return User.objects.filter(follower__in=subs)
-        return User.objects.all()
+            return self.get_subscriptions_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return User.objects.annotate(is_subscribed=Value(False))
+        return User.objects.annotate(is_subscribed=Exists(
+            Subscriptions.objects.filter(user=user, following=OuterRef('pk'))))
+
+    def get_subscriptions_queryset(self):
+        """
+        Авторы, на которых подписан пользователь, с числом рецептов.
+        recipes_limit режет вложенные рецепты прямо в базе.
+        """
+        recipes = Recipe.objects.order_by('-created_at', '-id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-created_at', '-id').values('pk')[
+                    :int(recipes_limit)]
+            ))
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True),
+        ).order_by('id').prefetch_related(
+            Prefetch('recipes', queryset=recipes))
 
     def get_serializer_class(self):
-        print(self.action)
         if self.action in ('list', 'retrieve', 'me'):
             return CustomUserSerializer
         if self.action == 'subscriptions':
@@ -153,7 +408,7 @@ class UsersViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(['get'], detail=False)
+    @action(['get'], detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
@@ -163,43 +418,54 @@ class UsersViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['POST', 'DELETE'])
+    @staticmethod
+    def refused(author_id, reason):
+        """Отказ: автора нет или причина reason."""
+        if User.objects.filter(pk=author_id).exists():
+            return Response(reason, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            'Объект не найден',
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=True, methods=['POST'])
     def subscribe(self, request, pk):
+        """
+        Не больше двух запросов: вставка или удаление одной командой,
+        затем счетчик подписчиков либо уточнение причины отказа.
+        """
         user = request.user
-        if not User.objects.filter(pk=pk).exists():
+        author_id = int(pk) if pk.isdigit() else None
+        if author_id == user.id:
             return Response(
-                'Объект не найден',
+                'Нельзя подписаться на себя',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        author = User.objects.get(pk=pk)
-        if request.method == 'POST':
-            if user == author:
-                return Response(
-                    'Нельзя подписаться на себя',
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if Subscriptions.objects.filter(
-                    following=author,
-                    user=user
-            ).exists():
-                return Response(
-                    'Вы уже подписаны',
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            Subscriptions.objects.create(following=author, user=user)
-            return Response(
-                'Подписка успешно создана',
-                status=status.HTTP_201_CREATED
-            )
-        if request.method == 'DELETE':
-            if not Subscriptions.objects.filter(
-                    following=author,
-                    user=user
-            ).exists():
-                return Response(
-                    'Вы и так не подписаны',
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            sub = Subscriptions.objects.get(following=author, user=user)
-            sub.delete()
+        with transaction.atomic():
+            created = author_id is not None and (
+                Subscriptions.objects.subscribe(user.id, author_id))
+            if created:
+                User.objects.filter(pk=author_id).update(
+                    followers_count=F('followers_count') + 1)
+        if not created:
+            return self.refused(author_id, 'Вы уже подписаны')
+        run_in_background(backfill_feed, user.id, author_id)
+        return Response(
+            'Подписка успешно создана',
+            status=status.HTTP_201_CREATED
+        )
+
+    @subscribe.mapping.delete
+    def unsubscribe(self, request, pk):
+        user = request.user
+        author_id = int(pk) if pk.isdigit() else None
+        with transaction.atomic():
+            deleted, _ = Subscriptions.objects.filter(
+                user=user, following_id=author_id).delete()
+            if deleted:
+                User.objects.filter(pk=author_id).update(
+                    followers_count=F('followers_count') - 1)
+        if not deleted:
+            return self.refused(author_id, 'Вы и так не подписаны')
+        run_in_background(drop_author_from_feed, user.id, author_id)
         return Response('Успешная отписка', status=status.HTTP_200_OK)
@@ -59,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -93,6 +94,9 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 #     }
 # }
 
+# CONN_MAX_AGE - сколько секунд держать соединение между запросами
+# (0 - новое соединение на каждый запрос). CONN_HEALTH_CHECKS - перед
+# запросом проверять, что база не оборвала постоянное соединение.
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE',
@@ -101,13 +105,48 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS') == 'True',
     }
 }
 
+# Кэш ответов справочников (тэги, ингридиенты), версий данных и токенов.
+# По умолчанию память процесса - только для разработки: сброс версий
+# не доходит до других воркеров. В infra/docker-compose.yml общий Redis:
+# CACHE_BACKEND=django_redis.cache.RedisCache
+# и CACHE_LOCATION=redis://redis:6379/1 для backend и backend_async.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', default=300)),
+    }
+}
+
+API_CACHE_ALIAS = 'default'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии картинок рецептов (ширина, высота).
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1024, 1024),
+}
+
+# Фоновые задачи в пуле потоков процесса.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER') == 'True'
+
+# Лента подписок: у авторов с большим числом подписчиков рецепты
+# не рассылаются, а дочитываются при запросе ленты.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000))
+FEED_BACKFILL_SIZE = 50
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -149,14 +188,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS':
         'api.pagination.CustomPagination',
@@ -171,6 +214,83 @@ AUTH_USER_MODEL = 'users.User'
 
 EMAIL_ADMIN = 'admin@foodgram.ru'
 
+# Автодополнение ингридиентов: сколько отдавать и как часто
+# перечитывать индекс из базы (секунды).
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+# Поиск рецептов по имеющимся ингридиентам.
+PANTRY_SEARCH_LIMIT = int(os.getenv('PANTRY_SEARCH_LIMIT', 50))
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 300))
+
+# Похожие рецепты: файлы индекса строит manage.py build_similarity_index.
+SIMILARITY_INDEX_DIR = os.getenv(
+    'SIMILARITY_INDEX_DIR', os.path.join(BASE_DIR, 'similarity'))
+SIMILARITY_LIMIT = int(os.getenv('SIMILARITY_LIMIT', 20))
+
+# Полнотекстовый поиск на SQLite (FTS5) ранжирует не больше стольких
+# совпадений; в PostgreSQL ограничения нет.
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+
+# Сколько рецептов можно добавить в избранное или корзину одним запросом.
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', 100))
+
+# Кэш токенов: SIZE записей в памяти процесса на TTL секунд,
+# SHARED - еще и в кэше API (общем, если бэкенд общий). SIZE=0 выключает.
+TOKEN_AUTH_CACHE = {
+    'SIZE': int(os.getenv('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', 60)),
+    'SHARED': os.getenv('TOKEN_AUTH_CACHE_SHARED') == 'True',
+}
+
+# Метрики ответов (api/middleware.py): сколько запросов к базе можно
+# на один ответ по имени маршрута и методу, больше - warning в логгер
+# api.metrics. Бюджет - замер на реалистичных данных (правка и удаление
+# рецепта в чужих корзинах, лента подписчика) с промахом кэша токенов,
+# его проверяет api/tests/test_query_budgets.py; запросы фоновых задач
+# (и с BACKGROUND_TASKS_EAGER) не считаются.
+# METRICS_LOG_LEVEL=INFO пишет метрики каждого ответа.
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+QUERY_BUDGETS = {
+    ('recipes-list', 'GET'): 5,
+    ('recipes-list', 'POST'): 15,
+    ('recipes-detail', 'GET'): 5,
+    ('recipes-detail', 'PATCH'): 24,
+    ('recipes-detail', 'DELETE'): 23,
+    ('recipes-feed', 'GET'): 5,
+    ('recipes-similar', 'GET'): 4,
+    ('recipes-pantry', 'GET'): 3,
+    ('recipes-download-shopping-cart', 'GET'): 3,
+    ('recipes-favorite', 'POST'): 8,
+    ('recipes-favorite', 'DELETE'): 5,
+    ('recipes-shopping-cart', 'POST'): 16,
+    ('recipes-shopping-cart', 'DELETE'): 10,
+    ('tags-list', 'GET'): 2,
+    ('ingredients-list', 'GET'): 2,
+    ('users-list', 'GET'): 5,
+    ('users-me', 'GET'): 2,
+    ('users-detail', 'GET'): 3,
+    ('users-subscriptions', 'GET'): 4,
+    ('users-subscribe', 'POST'): 4,
+    ('users-subscribe', 'DELETE'): 4,
+}
+SERVER_TIMING_HEADER = DEBUG or os.getenv('SERVER_TIMING_HEADER') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'PERMISSIONS': {
         'user': ['djoser.permissions.CurrentUserOrAdminOrReadOnly'],
@@ -0,0 +1,49 @@
+"""
+Пропускная способность при 200 одновременных соединениях:
+асинхронные /api/async/ под uvicorn-воркерами (backend_async)
+против тех же маршрутов DRF под синхронными воркерами gunicorn
+(backend). Число воркеров одинаковое - BENCH_WORKERS, по умолчанию
+как в infra: по одному.
+
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.asgi
+"""
+import os
+
+from benchmarks.common import (create_recipes, create_tags, create_user,
+                               load, serve, test_database)
+
+from rest_framework.authtoken.models import Token
+
+CONNECTIONS = int(os.getenv('BENCH_CONNECTIONS', 200))
+DURATION = int(os.getenv('BENCH_DURATION', 10))
+WORKERS = int(os.getenv('BENCH_WORKERS', 1))
+SERVERS = (
+    ('WSGI', 'backend.wsgi:application', 'sync', '/api/'),
+    ('ASGI', 'backend.asgi:application',
+     'uvicorn.workers.UvicornWorker', '/api/async/'),
+)
+
+
+def main():
+    with test_database(shared=True):
+        user = create_user('bench')
+        recipe = create_recipes(user, 200, tags=create_tags(),
+                                ingredients_per_recipe=5)[0]
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        paths = ('recipes/?limit=6', f'recipes/{recipe.id}/',
+                 'ingredients/?name=ingr', 'tags/')
+        print(f'{CONNECTIONS} connections, {DURATION} s, '
+              f'{WORKERS} worker(s)')
+        for name, application, worker_class, prefix in SERVERS:
+            with serve(application, worker_class, WORKERS) as port:
+                for path in paths:
+                    rps, p50, p99, errors = load(
+                        port, prefix + path, CONNECTIONS, DURATION, headers)
+                    print(f'{name} {path:>26}: {rps:7.1f} req/s, '
+                          f'p50 {p50:7.1f} ms, p99 {p99:7.1f} ms, '
+                          f'{errors} errors')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Обвязка бенчмарков: настройка Django, временная тестовая база,
+серверы и нагрузка. Наполняют базу фабрики тестов api/tests/utils.py.
+
+Запуск из папки backend, например:
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.token_auth
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import (CaptureQueriesContext,  # noqa: E402
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from api.tests.utils import (create_recipes, create_tags,  # noqa: E402,F401
+                             create_user)
+
+
+@contextmanager
+def test_database(shared=False):
+    """
+    Отдельная база на время бенчмарка, рабочая не трогается.
+    shared=True - SQLite в файле, а не в памяти: ее читают серверы
+    из serve().
+    """
+    if shared and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.mkdtemp(), 'bench.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def measure(func, repeat=1):
+    """Среднее время в мс и число запросов к базе за один вызов."""
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - start) / repeat
+    return result, elapsed * 1000, len(queries.captured_queries) / repeat
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def raw_request(port, path, headers=None):
+    """GET одним соединением (Connection: close) - для серверов без
+    keep-alive, как синхронные воркеры gunicorn."""
+    lines = [f'GET {path} HTTP/1.1', f'Host: 127.0.0.1:{port}',
+             'Connection: close']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+
+@contextmanager
+def serve(application, worker_class='sync', workers=1, **env):
+    """
+    gunicorn с приложением application ('backend.wsgi:application'
+    или 'backend.asgi:application') на тестовой базе из
+    test_database(shared=True). env - переменные окружения сервера.
+    """
+    port = free_port()
+    env = {**os.environ, 'DB_NAME': connection.settings_dict['NAME'],
+           **{name: str(value) for name, value in env.items()}}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', application,
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--worker-class', worker_class, '--log-level', 'warning'],
+        cwd=settings.BASE_DIR, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'gunicorn {application} not started')
+                time.sleep(0.1)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def _client(port, request, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        except OSError:
+            errors.append(None)
+            continue
+        if response[9:12] == b'200':
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response[9:12])
+
+
+def load(port, path, connections=200, duration=10, headers=None):
+    """
+    connections одновременных клиентов шлют GET path, пока не выйдет
+    duration секунд. Ответов в секунду, p50 и p99 в мс, число ошибок.
+    """
+    request = raw_request(port, path, headers)
+    latencies, errors = [], []
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            _client(port, request, deadline, latencies, errors)
+            for _ in range(connections)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    percentile = (
+        lambda share: latencies[int(len(latencies) * share)] * 1000
+        if latencies else 0)
+    return (len(latencies) / elapsed, percentile(0.5), percentile(0.99),
+            len(errors))
@@ -0,0 +1,48 @@
+"""
+Соединения с базой: одна и та же нагрузка при DB_CONN_MAX_AGE=0
+(новое соединение на каждый запрос) и DB_CONN_MAX_AGE=60 (постоянное,
+с проверкой DB_CONN_HEALTH_CHECKS). Разница заметна на PostgreSQL,
+где соединение - это TCP и авторизация:
+    DB_HOST=localhost python -m benchmarks.connections
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.connections
+"""
+import os
+
+from benchmarks.common import (create_recipes, create_tags, create_user,
+                               load, serve, test_database)
+
+from rest_framework.authtoken.models import Token
+
+CONNECTIONS = int(os.getenv('BENCH_CONNECTIONS', 20))
+DURATION = int(os.getenv('BENCH_DURATION', 10))
+MAX_AGES = (0, 60)
+SERVERS = (
+    ('WSGI', 'backend.wsgi:application', 'sync', '/api/'),
+    ('ASGI', 'backend.asgi:application',
+     'uvicorn.workers.UvicornWorker', '/api/async/'),
+)
+
+
+def main():
+    with test_database(shared=True):
+        user = create_user('bench')
+        recipe = create_recipes(user, 20, tags=create_tags(),
+                                ingredients_per_recipe=5)[0]
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        print(f'{CONNECTIONS} connections, {DURATION} s')
+        for name, application, worker_class, prefix in SERVERS:
+            for max_age in MAX_AGES:
+                with serve(application, worker_class,
+                           DB_CONN_MAX_AGE=max_age,
+                           DB_CONN_HEALTH_CHECKS=True) as port:
+                    rps, p50, p99, errors = load(
+                        port, f'{prefix}recipes/{recipe.id}/',
+                        CONNECTIONS, DURATION, headers)
+                print(f'{name} CONN_MAX_AGE={max_age:<2}: {rps:7.1f} req/s, '
+                      f'p50 {p50:6.1f} ms, p99 {p99:6.1f} ms, '
+                      f'{errors} errors')
+
+
+if __name__ == '__main__':
+    main()
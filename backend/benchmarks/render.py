@@ -0,0 +1,42 @@
+"""
+Рендер страницы рецептов: FastJSONRenderer (orjson) против
+стандартного JSONRenderer DRF на одних и тех же данных.
+
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.render
+"""
+from benchmarks.common import (client_for, create_recipes, create_tags,
+                               create_user, measure, test_database)
+
+# Настройки DRF читаются при импорте - только после django.setup().
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer, orjson
+
+PAGE_SIZES = (20, 500)
+REPEAT = 50
+
+
+def main():
+    if orjson is None:
+        print('orjson is not installed, FastJSONRenderer falls back '
+              'to JSONRenderer')
+    with test_database():
+        user = create_user('bench')
+        create_recipes(user, max(PAGE_SIZES), tags=create_tags(),
+                       ingredients_per_recipe=5)
+        client = client_for(user)
+        for size in PAGE_SIZES:
+            data = client.get(f'/api/recipes/?limit={size}').data
+            results = {}
+            for renderer in (JSONRenderer(), FastJSONRenderer()):
+                content, ms, _ = measure(
+                    lambda: renderer.render(data), REPEAT)
+                results[type(renderer).__name__] = ms
+                print(f'{size:>4} recipes {type(renderer).__name__:>16}: '
+                      f'{ms:7.2f} ms, {len(content)} bytes')
+            speedup = results['JSONRenderer'] / results['FastJSONRenderer']
+            print(f'{size:>4} recipes {"speedup":>16}: {speedup:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
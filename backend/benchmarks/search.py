@@ -0,0 +1,67 @@
+"""
+Поиск ?search= по BENCH_RECIPES рецептов (по умолчанию миллион):
+запрос к базе и ответ API. Цель - до 10 мс на избирательный запрос.
+Рецепты поровну у десяти авторов и называются '<блюдо> recipe <номер>':
+номер находит по рецепту у каждого автора, блюдо - каждый десятый
+рецепт, 'ingredient' - все.
+
+PostgreSQL (tsvector и GIN-индекс), настройки базы как у backend:
+    DB_HOST=localhost python -m benchmarks.search
+SQLite (FTS5), на меньшем объеме:
+    DB_ENGINE=django.db.backends.sqlite3 BENCH_RECIPES=100000 \\
+        python -m benchmarks.search
+"""
+import os
+
+from benchmarks.common import (client_for, create_recipes, create_user,
+                               measure, test_database)
+
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+RECIPES = int(os.getenv('BENCH_RECIPES', 1_000_000))
+DISHES = ('борщ', 'плов', 'окрошка', 'солянка', 'рагу',
+          'пирог', 'салат', 'суп', 'каша', 'омлет')
+QUERIES = ('4242', 'плов 4242', 'пирог', 'ingredient')
+REPEAT = 20
+TARGET_MS = 10
+
+
+def search(query):
+    return list(RecipeFilter(
+        QueryDict(f'search={query}'), queryset=Recipe.objects.all()
+    ).qs.values_list('id', flat=True)[:10])
+
+
+def main():
+    with test_database():
+        per_author = RECIPES // len(DISHES)
+        for dish in DISHES:
+            author = create_user(f'bench-{dish}')
+            create_recipes(author, per_author, ingredients_per_recipe=5)
+            Recipe.objects.filter(author=author).update(
+                name=Concat(Value(f'{dish} '), F('name')))
+        update_search_index()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        client = client_for(create_user('bench'))
+        print(f'{Recipe.objects.count()} recipes, {connection.vendor}')
+        for query in QUERIES:
+            search(query)
+            ids, query_ms, _ = measure(lambda: search(query), REPEAT)
+            _, api_ms, _ = measure(lambda: client.get(
+                f'/api/recipes/?search={query}&limit=6'), REPEAT)
+            mark = 'ok' if query_ms < TARGET_MS else f'> {TARGET_MS} ms'
+            print(f'{query!r:>14}: query {query_ms:7.2f} ms ({mark}), '
+                  f'API {api_ms:7.2f} ms, top {len(ids)}')
+
+
+if __name__ == '__main__':
+    main()
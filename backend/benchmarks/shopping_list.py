@@ -0,0 +1,67 @@
+"""
+Выгрузка списка покупок: время до первого байта, общее время
+и пик памяти Python при потоковой отдаче и при сборке ответа
+целиком (как было до StreamingHttpResponse).
+
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.shopping_list
+"""
+import time
+import tracemalloc
+
+from benchmarks.common import (client_for, create_recipes, create_user,
+                               test_database)
+
+from recipes.models import ShoppingCart, ShoppingListItem
+
+SIZES = (10, 1000, 10000)
+URL = '/api/recipes/download_shopping_cart/?format={}'
+
+
+def download(client, export_format, buffered):
+    """
+    (мс до первого байта, мс всего, пик памяти в КБ, байт).
+    Собранный целиком ответ не уходит, пока не готов весь.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    content = client.get(URL.format(export_format)).streaming_content
+    if buffered:
+        size = len(b''.join(content))
+        ttfb = time.perf_counter() - start
+    else:
+        size = len(next(content))
+        ttfb = time.perf_counter() - start
+        size += sum(len(chunk) for chunk in content)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ttfb * 1000, total * 1000, peak / 1024, size
+
+
+def main():
+    print(f'{"recipes":>8} {"format":>6} {"mode":>9} {"ttfb ms":>8} '
+          f'{"total ms":>9} {"peak KB":>8} {"bytes":>9}')
+    with test_database():
+        for count in SIZES:
+            # У каждой строки списка свой ингридиент: строк столько же,
+            # сколько рецептов в корзине.
+            user = create_user(f'bench{count}')
+            recipes = create_recipes(user, count, ingredients_per_recipe=5,
+                                     ingredients_count=count)
+            ShoppingCart.objects.bulk_create(
+                (ShoppingCart(user=user, recipe=recipe)
+                 for recipe in recipes), batch_size=1000)
+            ShoppingListItem.objects.rebuild()
+            client = client_for(user)
+            client.get(URL.format('txt'))
+            for export_format in ('txt', 'csv', 'json'):
+                for mode in ('streaming', 'buffered'):
+                    ttfb, total, peak, size = download(
+                        client, export_format, mode == 'buffered')
+                    print(f'{count:>8} {export_format:>6} {mode:>9} '
+                          f'{ttfb:>8.2f} {total:>9.2f} {peak:>8.0f} '
+                          f'{size:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Кэш токенов: запросов к базе и время на запрос с кэшем и без,
+счетчики попаданий/промахов и сброс при выходе.
+
+    DB_ENGINE=django.db.backends.sqlite3 python -m benchmarks.token_auth
+"""
+from django.conf import settings
+
+from benchmarks.common import (client_for, create_user, measure,
+                               test_database)
+
+from api.authentication import token_cache
+
+REQUESTS = 300
+URL = '/api/users/me/'
+
+
+def main():
+    with test_database():
+        client = client_for(create_user('bench'))
+        for size in (0, settings.TOKEN_AUTH_CACHE['SIZE']):
+            settings.TOKEN_AUTH_CACHE['SIZE'] = size
+            client.get(URL)
+            _, ms, queries = measure(lambda: client.get(URL), REQUESTS)
+            print(f'cache {"on " if size else "off"}: '
+                  f'{queries:.1f} queries/request, {ms:.2f} ms/request')
+        print('stats:', token_cache.stats())
+        client.post('/api/auth/token/logout/')
+        print('after logout:', client.get(URL).status_code)
+
+
+if __name__ == '__main__':
+    main()
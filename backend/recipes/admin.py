@@ -7,7 +7,8 @@ from .models import (Favorite, Ingredient, Recipe, IngredientRecipe,
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
-        'author'
+        'author',
+        'count_favorites'
     )
     list_filter = (
         'author',
@@ -16,8 +17,9 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     empty_value_display = '-пусто-'
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 class IngredientRecipeAdmin(admin.ModelAdmin):
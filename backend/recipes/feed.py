@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+
+from users.models import Subscriptions
+
+from .models import FeedItem, Recipe
+
+BATCH_SIZE = 1000
+
+
+def heavy_authors(user):
+    """
+    Авторы из подписок пользователя, у которых слишком много
+    подписчиков для рассылки: их рецепты читаются напрямую.
+    """
+    return list(Subscriptions.objects.filter(
+        user=user,
+        following__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('following_id', flat=True))
+
+
+def feed_queryset(user, queryset):
+    """
+    Рецепты ленты с полем feed_created_at для пагинации по курсору.
+    Обычно это один проход по индексу ленты пользователя.
+    """
+    authors = heavy_authors(user)
+    if not authors:
+        return queryset.filter(feed_items__user=user).annotate(
+            feed_created_at=F('feed_items__created_at'))
+    return queryset.filter(
+        Q(Exists(FeedItem.objects.filter(user=user, recipe=OuterRef('pk'))))
+        | Q(author_id__in=authors)
+    ).annotate(feed_created_at=F('created_at'))
+
+
+def push(user_ids, recipes):
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, recipe_id=recipe_id, created_at=created_at)
+         for user_id in user_ids for recipe_id, created_at in recipes],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_recipe(recipe_id):
+    """Рассылает новый рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values_list(
+        'author_id', 'created_at', 'author__followers_count').first()
+    if recipe is None or recipe[0] is None:
+        return
+    author_id, created_at, followers_count = recipe
+    if followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    followers = Subscriptions.objects.filter(following_id=author_id)
+    user_ids = []
+    for user_id in followers.values_list('user_id', flat=True).iterator():
+        user_ids.append(user_id)
+        if len(user_ids) == BATCH_SIZE:
+            push(user_ids, [(recipe_id, created_at)])
+            user_ids = []
+    push(user_ids, [(recipe_id, created_at)])
+
+
+def backfill_feed(user_id, author_id):
+    """Кладет в ленту последние рецепты автора после подписки."""
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-created_at', '-id')[:settings.FEED_BACKFILL_SIZE]
+    push([user_id], list(recipes.values_list('id', 'created_at')))
+
+
+def drop_author_from_feed(user_id, author_id):
+    FeedItem.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
@@ -0,0 +1,46 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, features
+
+from .models import Recipe
+
+VARIANTS_DIR = 'recipes/variants'
+
+
+def variant_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def build_image_variants(recipe_id):
+    """
+    Нарезает уменьшенные копии картинки рецепта
+    (размеры в RECIPE_IMAGE_VARIANTS) и сохраняет пути в image_variants.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    image_name = recipe.image.name
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    image_format, extension = variant_format()
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    original = original.convert('RGB')
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        buffer = BytesIO()
+        image.save(buffer, image_format, quality=80)
+        path = f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        variants[variant] = default_storage.save(
+            path, ContentFile(buffer.getvalue()))
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants, updateed_at=timezone.now())
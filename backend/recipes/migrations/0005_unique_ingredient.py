@@ -0,0 +1,55 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Старые загрузки плодили дубли ингридиентов.
+    Оставляем самый ранний и переносим на него ссылки.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        # Внешние ключи DEFERRABLE INITIALLY DEFERRED: без этого удаление
+        # оставит отложенные проверки, и AddConstraint в той же транзакции
+        # упадет с "pending trigger events".
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for group in duplicates:
+        extra_ids = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        IngredientRecipe.objects.filter(
+            ingredient_id__in=extra_ids
+        ).update(ingredient_id=group['keep_id'])
+        for item in ShoppingListItem.objects.filter(
+                ingredient_id__in=extra_ids):
+            keeper, _ = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id, ingredient_id=group['keep_id'])
+            keeper.total_amount += item.total_amount
+            keeper.save()
+            item.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
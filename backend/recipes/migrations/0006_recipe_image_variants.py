@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Заполняется фоновой задачей после сохранения картинки', verbose_name='Уменьшенные копии картинки'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:02
+
+from django.db import migrations
+import recipes.models
+from recipes.search import (create_search_index, drop_search_index,
+                            update_search_index)
+
+
+def fill_search_index(apps, schema_editor):
+    create_search_index(schema_editor)
+    update_search_index(using=schema_editor.connection.alias)
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=recipes.models.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_index, remove_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search'),
+    ]
+
+    # Таблицу связей recipe_tags Django создает сам, поэтому индекс
+    # (tag_id, recipe_id) добавляется SQL. Вместе с уникальным
+    # (recipe_id, tag_id) он покрывает проход с обеих сторон.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+def drop_duplicates(model):
+    """Удаляет повторы (user, recipe), возвращает затронутые пары."""
+    duplicates = model.objects.values('user_id', 'recipe_id').annotate(
+        keep_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    affected = []
+    for group in duplicates:
+        model.objects.filter(
+            user_id=group['user_id'], recipe_id=group['recipe_id']
+        ).exclude(id=group['keep_id']).delete()
+        affected.append((group['user_id'], group['recipe_id']))
+    return affected
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Повторные добавления в избранное и корзину удваивали счетчики
+    и сводный список покупок, поэтому после чистки они пересчитываются.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    for model, counter in ((Favorite, 'favorites_count'),
+                           (ShoppingCart, 'in_carts_count')):
+        for user_id, recipe_id in drop_duplicates(model):
+            Recipe.objects.filter(pk=recipe_id).update(**{
+                counter: model.objects.filter(recipe_id=recipe_id).count()
+            })
+            if model is not ShoppingCart:
+                continue
+            ShoppingListItem.objects.filter(user_id=user_id).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(user_id=user_id, **row)
+                for row in IngredientRecipe.objects.filter(
+                    recipe__shopping_cart__user_id=user_id
+                ).values('ingredient_id').annotate(
+                    total_amount=models.Sum('amount')
+                ).order_by()
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_tags_tag_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+    ]
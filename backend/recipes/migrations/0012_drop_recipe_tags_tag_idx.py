@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_unique_favorite_shopping_cart'),
+    ]
+
+    # Фильтр ?tags= проверяет EXISTS по уникальному (recipe_id, tag_id),
+    # а для прохода со стороны тэга у Django есть индекс по tag_id:
+    # (tag_id, recipe_id) планы не выбирают.
+    operations = [
+        migrations.RunSQL(
+            'DROP INDEX IF EXISTS recipe_tags_tag_recipe_idx',
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef,
+                              Prefetch, Sum, Value, When)
 
-from users.models import User
+from users.models import Subscriptions, User
 
 
 class Tag(models.Model):
@@ -45,10 +47,89 @@ class Ingredient(models.Model):
         max_length=40
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class SearchVectorField(models.Field):
+    """
+    Поисковый вектор рецепта: tsvector в PostgreSQL.
+    В других базах колонка не используется, см. recipes.search.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return 'text'
+
+
+class RecipeQuerySet(models.QuerySet):
+    """
+    Выборка рецептов для чтения за фиксированное число запросов.
+    """
+
+    @staticmethod
+    def related_lookups():
+        """Что подгружать пачкой для RecipeReadSerializer."""
+        return (
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+    def with_flags(self, user):
+        """
+        Флаги текущего пользователя подзапросами Exists:
+        избранное, корзина и подписка на автора.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_subscribed=Exists(Subscriptions.objects.filter(
+                user=user, following=OuterRef('author'))),
+        )
+
+    def bump(self, field, delta):
+        """Сдвигает счетчик одним UPDATE, без чтения строк."""
+        return self.update(**{field: F(field) + delta})
+
+    def with_related(self, user):
+        """Флаги пользователя плюс автор, тэги и ингридиенты."""
+        return self.with_flags(user).select_related(
+            'author'
+        ).prefetch_related(*self.related_lookups())
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    """Поисковый вектор не нужен при чтении рецептов."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(models.Model):
     """
     Модель рецепта.
@@ -69,6 +150,12 @@ class Recipe(models.Model):
         upload_to='recipes/',
         help_text='Загрузите сюда картинку вашего рецепта'
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        help_text='Заполняется фоновой задачей после сохранения картинки'
+    )
     text = models.TextField(
         verbose_name='Текстовое описание',
         help_text='Текстовое описание рецепта'
@@ -93,6 +180,32 @@ class Recipe(models.Model):
     updateed_at = models.DateTimeField(
         auto_now=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeManager()
+
+    class Meta:
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -122,6 +235,47 @@ class IngredientRecipe(models.Model):
         return f'{self.ingredient} : {self.amount}'
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    """
+    Добавление и удаление связей пользователь - рецепт одной командой
+    с RETURNING: счетчики и списки покупок меняются только для тех
+    рецептов, которые эта команда действительно добавила или убрала.
+    """
+
+    def _returning(self, sql, params):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def add(self, user_id, recipe_ids):
+        """id добавленных рецептов; несуществующие и уже связанные - нет."""
+        if not recipe_ids:
+            return []
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        return self._returning(
+            f'INSERT INTO {table} (user_id, recipe_id) '
+            f'SELECT %s, id FROM {Recipe._meta.db_table} '
+            f'WHERE id IN ({placeholders}) '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            f'RETURNING recipe_id',
+            [user_id, *recipe_ids]
+        )
+
+    def remove(self, user_id, recipe_ids):
+        """id рецептов, связи с которыми удалены."""
+        if not recipe_ids:
+            return []
+        table = self.model._meta.db_table
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        return self._returning(
+            f'DELETE FROM {table} '
+            f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+            f'RETURNING recipe_id',
+            [user_id, *recipe_ids]
+        )
+
+
 class Favorite(models.Model):
     """
     Модель для добавления рецепта в ИЗБРАННОЕ.
@@ -139,6 +293,16 @@ class Favorite(models.Model):
         related_name='favorites',
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'
+            ),
+        ]
+
 
 class ShoppingCart(models.Model):
     """
@@ -156,3 +320,171 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='shopping_cart',
     )
+
+    objects = UserRecipeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart'
+            ),
+        ]
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """
+    Инкрементальное обновление сводного списка покупок.
+    """
+
+    @staticmethod
+    def recipe_amounts(recipe_ids):
+        """Сумма каждого ингридиента по переданным рецептам."""
+        return dict(
+            IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('ingredient_id').annotate(Sum('amount'))
+        )
+
+    def apply(self, user_ids, amounts):
+        """
+        Прибавляет amounts ({ingredient_id: delta}) к спискам пользователей
+        и удаляет позиции, которые обнулились.
+        """
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=ingredient_id)
+                 for user_id in user_ids
+                 for ingredient_id, amount in amounts.items() if amount > 0],
+                ignore_conflicts=True
+            )
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            )
+            items.update(total_amount=F('total_amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in amounts.items()],
+                output_field=IntegerField()
+            ))
+            items.filter(total_amount__lte=0).delete()
+
+    def add_recipes(self, user, recipe_ids):
+        self.apply([user.id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        amounts = self.recipe_amounts(recipe_ids)
+        self.apply(
+            [user.id], {key: -value for key, value in amounts.items()}
+        )
+
+    def drop_recipe(self, recipe):
+        """Убирает рецепт из списков всех, у кого он в корзине."""
+        amounts = self.recipe_amounts([recipe.id])
+        user_ids = list(ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True))
+        self.apply(
+            user_ids, {key: -value for key, value in amounts.items()}
+        )
+
+    def apply_recipe_change(self, recipe, delta):
+        """
+        Переносит в списки покупок изменение состава рецепта.
+        delta - {ingredient_id: новое количество минус старое}.
+        """
+        if not any(delta.values()):
+            return
+        user_ids = list(ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True))
+        self.apply(user_ids, delta)
+
+    def rebuild(self):
+        """Пересчитывает все списки покупок с нуля."""
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(**row) for row in self.expected()
+            )
+
+    @staticmethod
+    def expected():
+        """Сводный список, посчитанный напрямую по корзинам."""
+        return IngredientRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user_id')
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+
+class ShoppingListItem(models.Model):
+    """
+    Денормализованный список покупок: сумма ингридиента
+    по всем рецептам из корзины пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингридиент',
+        related_name='shopping_list_items',
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} : {self.total_amount}'
+
+
+class FeedItem(models.Model):
+    """
+    Лента пользователя: рецепты авторов, на которых он подписан.
+    Заполняется фоновой задачей при публикации рецепта.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_items',
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-created_at', '-recipe'),
+                name='feed_user_created_at_idx'
+            ),
+        ]
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+BATCH_SIZE = 500
+
+PG_VECTOR = f"""
+    setweight(to_tsvector('{CONFIG}', coalesce(r.name, '')), 'A')
+    || setweight(to_tsvector('{CONFIG}', coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector('{CONFIG}', coalesce(r.text, '')), 'C')
+"""
+FTS_ROWS = """
+    SELECT r.id, r.name, r.text, coalesce((
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientrecipe ir
+        JOIN recipes_ingredient i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = r.id
+    ), '')
+    FROM recipes_recipe r
+"""
+# Веса bm25 по колонкам FTS5: название, описание, ингридиенты.
+FTS_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 5.0)'
+
+
+def create_search_index(schema_editor):
+    """
+    PostgreSQL: GIN-индекс по search_vector.
+    SQLite: таблица FTS5 с названием, описанием и ингридиентами.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "name, text, ingredients, tokenize='unicode61')")
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def update_search_index(recipe_ids=None, using='default'):
+    """
+    Пересчитывает поисковые данные рецептов, None - всех.
+    Удаленные рецепты убираются из FTS5.
+    """
+    connection = connections[using]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    if recipe_ids is None:
+        batches = [None]
+    else:
+        recipe_ids = list(recipe_ids)
+        batches = [recipe_ids[start:start + BATCH_SIZE]
+                   for start in range(0, len(recipe_ids), BATCH_SIZE)]
+    with connection.cursor() as cursor:
+        for batch in batches:
+            if batch == []:
+                continue
+            where, params = '', []
+            if batch is not None:
+                where = f'WHERE r.id IN ({", ".join(["%s"] * len(batch))})'
+                params = batch
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'UPDATE recipes_recipe r SET search_vector = '
+                    f'{PG_VECTOR} {where}', params)
+                continue
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} '
+                f'{where.replace("r.id", "rowid")}', params)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                f'{FTS_ROWS} {where}', params)
+
+
+def fts_query(query):
+    """Слова запроса как фразы FTS5, чтобы спецсимволы не ломали MATCH."""
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def fts_ranked(connection, query):
+    """
+    Лучшие совпадения FTS5 одним запросом: bm25 считается в одном
+    проходе, а не коррелированным подзапросом на каждую строку.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, -{FTS_RANK} FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s ORDER BY 2 DESC LIMIT %s',
+            [match, settings.SEARCH_MAX_RESULTS])
+        return cursor.fetchall()
+
+
+def search_recipes(queryset, query):
+    """
+    Фильтрует рецепты по запросу и добавляет search_rank:
+    чем больше, тем лучше совпадение. В SQLite берутся только
+    SEARCH_MAX_RESULTS лучших совпадений.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{CONFIG}', %s)"
+        return queryset.filter(RawSQL(
+            f'recipes_recipe.search_vector @@ {tsquery}', [query],
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {tsquery})', [query],
+            output_field=FloatField()
+        ))
+    if vendor == 'sqlite':
+        ranked = fts_ranked(connections[queryset.db], query)
+        return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(rank)) for pk, rank in ranked],
+                default=Value(0.0), output_field=FloatField()
+            ))
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
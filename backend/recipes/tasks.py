@@ -0,0 +1,81 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.BACKGROUND_WORKERS,
+    thread_name_prefix='foodgram-task'
+)
+
+_local = threading.local()
+
+
+def in_eager_task():
+    """
+    True внутри задачи, выполненной сразу (BACKGROUND_TASKS_EAGER):
+    ее запросы к базе относятся к фону, а не к ответу.
+    """
+    return getattr(_local, 'eager', False)
+
+
+def _run_eager(func, *args):
+    outer, _local.eager = in_eager_task(), True
+    try:
+        func(*args)
+    finally:
+        _local.eager = outer
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    """
+    Ставит задачу в пул потоков после коммита текущей транзакции.
+    С BACKGROUND_TASKS_EAGER выполняет ее сразу (для тестов).
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(lambda: _run_eager(func, *args))
+        return
+    transaction.on_commit(lambda: executor.submit(_run, func, *args))
+
+
+class _Batch:
+    """ids, накопленные для func до коммита транзакции."""
+
+    def __init__(self, func, using):
+        self.func, self.using, self.ids = func, using, set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.func(sorted(self.ids), self.using)
+
+
+def on_commit_batched(func, ids, using='default'):
+    """
+    Копит ids до коммита транзакции и вызывает func(ids, using)
+    один раз на транзакцию, сколько бы раз ее ни запланировали.
+    Пачка живет в очереди on_commit соединения: откат выбрасывает
+    ее вместе с ids, и следующая транзакция начинает с пустой.
+    """
+    for entry in connections[using].run_on_commit:
+        batch = entry[1]
+        if (isinstance(batch, _Batch) and not batch.done
+                and batch.func == func):
+            batch.ids.update(ids)
+            return
+    batch = _Batch(func, using)
+    batch.ids.update(ids)
+    transaction.on_commit(batch, using=using)
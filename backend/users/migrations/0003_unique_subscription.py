@@ -0,0 +1,52 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:18
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def drop_bad_subscriptions(apps, schema_editor):
+    """
+    Удаляет подписки на себя и повторные подписки,
+    затем пересчитывает подписчиков у затронутых авторов.
+    """
+    User = apps.get_model('users', 'User')
+    Subscriptions = apps.get_model('users', 'Subscriptions')
+    self_follows = Subscriptions.objects.filter(
+        user=models.F('following'))
+    authors = set(self_follows.values_list('following_id', flat=True))
+    self_follows.delete()
+    duplicates = Subscriptions.objects.values(
+        'user_id', 'following_id'
+    ).annotate(
+        keep_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for group in duplicates:
+        Subscriptions.objects.filter(
+            user_id=group['user_id'], following_id=group['following_id']
+        ).exclude(id=group['keep_id']).delete()
+        authors.add(group['following_id'])
+    for author_id in authors:
+        User.objects.filter(pk=author_id).update(
+            followers_count=Subscriptions.objects.filter(
+                following_id=author_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_bad_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='subscriptions',
+            constraint=models.UniqueConstraint(fields=('user', 'following'), name='unique_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscriptions',
+            constraint=models.CheckConstraint(check=models.Q(('user', django.db.models.expressions.F('following')), _negated=True), name='no_self_subscription'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models
 
 
 class User(AbstractUser):
@@ -36,6 +36,14 @@ class User(AbstractUser):
         max_length=150,
         blank=True
     )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='подписчиков',
+        default=0
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='рецептов',
+        default=0
+    )
 
     class Meta:
         ordering = ('id',)
@@ -46,6 +54,27 @@ class User(AbstractUser):
         return self.username
 
 
+class SubscriptionsQuerySet(models.QuerySet):
+
+    def subscribe(self, user_id, author_id):
+        """
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING одной командой.
+        True, если подписка создана; False, если она уже была
+        или автора нет.
+        """
+        table = self.model._meta.db_table
+        users = User._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, following_id) '
+                f'SELECT %s, id FROM {users} WHERE id = %s '
+                f'ON CONFLICT (user_id, following_id) DO NOTHING '
+                f'RETURNING id',
+                [user_id, author_id]
+            )
+            return cursor.fetchone() is not None
+
+
 class Subscriptions(models.Model):
     user = models.ForeignKey(
         User,
@@ -58,9 +87,21 @@ class Subscriptions(models.Model):
         related_name='following'
     )
 
+    objects = SubscriptionsQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'following'),
+                name='unique_subscription'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('following')),
+                name='no_self_subscription'
+            ),
+        ]
 
     def __str__(self):
         return f'Пользователь: {self.user} подписан на {self.following}'